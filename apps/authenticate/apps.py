@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AuthConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.authenticate'
+
+    def ready(self):
+        from apps.authenticate import signals  # noqa: F401
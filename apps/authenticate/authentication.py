@@ -0,0 +1,147 @@
+from uuid import uuid4
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import authentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+
+class JWTAuthentication(authentication.JWTAuthentication):
+    """Adds ``aauthenticate`` for views dispatched on the event loop, the user is loaded with the async ORM"""
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+
+        return await self.aget_user(validated_token), validated_token
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+    async def aget_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+
+        try:
+            user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        return user
+
+
+CACHE_ALIAS = 'user_flags'
+
+FLAGS = ('is_active', 'is_staff', 'is_superuser')
+
+
+class UserFlagsCache:
+    """
+    FLAGS of users in the ``user_flags`` cache, entries live USER_FLAGS_TTL seconds.
+
+    Every entry carries the version of its user, saving or deleting a user sets a new version, so an
+    entry read from the database before the change is never served after it. With a cache shared between
+    workers (USER_FLAGS_CACHE_BACKEND) every worker sees the change on its next request, with the default
+    per-process cache the other workers see it within USER_FLAGS_TTL. QuerySet.update() sends no signal,
+    call invalidate() after updating the flags with it.
+    """
+
+    def get_cache(self):
+        return caches[CACHE_ALIAS]
+
+    def keys(self, user_id):
+        return f'flags:{user_id}', f'flags:version:{user_id}'
+
+    def new_version(self, user_id):
+        _, version_key = self.keys(user_id)
+        version = uuid4().hex
+        self.get_cache().set(version_key, version, timeout=None)
+        return version
+
+    def get(self, user_id):
+        """The cached flags and the current version of the user, one round trip"""
+
+        key, version_key = self.keys(user_id)
+        values = self.get_cache().get_many([key, version_key])
+        version, entry = values.get(version_key), values.get(key)
+        if version is not None and entry is not None and entry[0] == version:
+            return entry[1], version
+        return None, version
+
+    def set(self, user_id, version, flags):
+        if flags is not None:
+            self.get_cache().set(self.keys(user_id)[0], (version, flags), timeout=settings.USER_FLAGS_TTL)
+        return flags
+
+    def invalidate(self, user_id):
+        self.new_version(user_id)
+
+    def clear(self):
+        self.get_cache().clear()
+
+    def query(self, user_id):
+        return get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values_list(*FLAGS)
+
+    def load(self, user_id):
+        flags, version = self.get(user_id)
+        if flags is None:
+            # the version is read before the row, a change committed meanwhile outdates what is stored
+            version = version or self.new_version(user_id)
+            flags = self.set(user_id, version, self.query(user_id).first())
+        return flags
+
+    async def aload(self, user_id):
+        flags, version = await sync_to_async(self.get)(user_id)
+        if flags is None:
+            version = version or await sync_to_async(self.new_version)(user_id)
+            flags = await sync_to_async(self.set)(user_id, version, await self.query(user_id).afirst())
+        return flags
+
+
+user_flags = UserFlagsCache()
+
+
+class ClaimsUser(TokenUser):
+    """User built from the token claims, carries the id and the cached FLAGS but no other field of the row"""
+
+    def __init__(self, token, flags):
+        super().__init__(token)
+        self.is_active, self.is_staff, self.is_superuser = flags
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Authenticates with the token claims and the cached user flags instead of loading the User row,
+    ``request.user`` is a ClaimsUser then, views have to go through ``request.user.id``.
+    """
+
+    def make_user(self, validated_token, flags):
+        if flags is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if not flags[0]:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        return ClaimsUser(validated_token, flags)
+
+    def get_user(self, validated_token):
+        return self.make_user(validated_token, user_flags.load(self.get_user_id(validated_token)))
+
+    async def aget_user(self, validated_token):
+        return self.make_user(validated_token, await user_flags.aload(self.get_user_id(validated_token)))
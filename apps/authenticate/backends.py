@@ -0,0 +1,25 @@
+from django.contrib.auth import backends
+from django.contrib.auth import get_user_model
+from apps.authenticate import hashers
+
+
+class ModelBackend(backends.ModelBackend):
+    """Checks the passwords in the hashing pool, see apps.authenticate.hashers.check_password"""
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user_model = get_user_model()
+        if username is None:
+            username = kwargs.get(user_model.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        try:
+            user = user_model._default_manager.get_by_natural_key(username)
+        except user_model.DoesNotExist:
+            # hash once anyway, unknown usernames must not answer faster
+            hashers.make_password(password)
+            return None
+
+        if hashers.check_password(user, password) and self.user_can_authenticate(user):
+            return user
+        return None
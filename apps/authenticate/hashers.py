@@ -0,0 +1,118 @@
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections
+
+
+logger = logging.getLogger(__name__)
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    """Iterations read from PASSWORD_HASH_ITERATIONS, hashes with another count are updated on login"""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    """Work factor read from PASSWORD_SCRYPT_WORK_FACTOR, hashes with another one are updated on login"""
+
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR
+
+
+_executor = None
+_executor_workers = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """The pool, built again when PASSWORD_HASH_WORKERS changed, hashes already submitted finish in the old one"""
+
+    global _executor, _executor_workers
+
+    with _executor_lock:
+        if _executor is None or _executor_workers != settings.PASSWORD_HASH_WORKERS:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor_workers = settings.PASSWORD_HASH_WORKERS
+            _executor = ThreadPoolExecutor(max_workers=_executor_workers, thread_name_prefix='hashing')
+    return _executor
+
+
+def run(function, *args):
+    """
+    Calls ``function`` in the hashing pool and waits for it. The pool bounds how many cores a worker
+    spends on hashing, the calling thread stays blocked meanwhile. Synchronous views run in a thread of
+    their own under ASGI, they do not block the event loop.
+    """
+
+    # hashlib releases the GIL while hashing
+    if settings.PASSWORD_HASH_WORKERS:
+        return get_executor().submit(function, *args).result()
+    return function(*args)
+
+
+def make_password(password):
+    return run(hashers.make_password, password)
+
+
+def make_passwords(passwords):
+    """Hashes of the passwords, spread over the pool threads"""
+
+    if settings.PASSWORD_HASH_WORKERS:
+        return list(get_executor().map(hashers.make_password, passwords))
+    return [hashers.make_password(password) for password in passwords]
+
+
+def rehash(user_id, password, encoded):
+    # only while the hash is the checked one, a password changed meanwhile is kept
+    get_user_model().objects.filter(pk=user_id, password=encoded).update(password=hashers.make_password(password))
+
+
+def rehash_in_worker(user_id, password, encoded):
+    try:
+        rehash(user_id, password, encoded)
+    except Exception:
+        logger.exception('failed to rehash the password of user #%s', user_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_rehash(user_id, password, encoded):
+    """Updates an outdated hash after the login answered, inline when PASSWORD_HASH_WORKERS is 0"""
+
+    if settings.PASSWORD_HASH_WORKERS:
+        get_executor().submit(rehash_in_worker, user_id, password, encoded)
+    else:
+        rehash(user_id, password, encoded)
+
+
+def must_update(encoded):
+    preferred = hashers.get_hasher('default')
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def check_password(user, password):
+    """
+    Checks the password of the user in the hashing pool. Unlike User.check_password, a hash made with
+    another hasher or cost is not updated before answering but in the background.
+    """
+
+    encoded = user.password
+    if not run(hashers.check_password, password, encoded):
+        return False
+
+    if must_update(encoded):
+        schedule_rehash(user.pk, password, encoded)
+    return True
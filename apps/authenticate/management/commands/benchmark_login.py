@@ -0,0 +1,92 @@
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.management import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from apps.authenticate import hashers
+from apps.core.management.commands.benchmark import PASSWORD, percentiles
+
+COST_SETTINGS = {
+    'pbkdf2_sha256': 'PASSWORD_HASH_ITERATIONS',
+    'scrypt': 'PASSWORD_SCRYPT_WORK_FACTOR',
+}
+
+
+class Command(BaseCommand):
+    help = 'Reports how many password logins per second a worker process checks at each hashing cost'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='logins checked at every cost')
+        parser.add_argument('--concurrency', type=int, default=4, help='request threads of the worker')
+        parser.add_argument(
+            '--costs', type=int, nargs='+',
+            help='PBKDF2 iterations or scrypt work factors following PASSWORD_HASHER, the configured one by default'
+        )
+
+    def handle(self, *args, **options):
+        cost_setting = COST_SETTINGS[settings.PASSWORD_HASHER]
+        costs = options['costs'] or [getattr(settings, cost_setting)]
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+        try:
+            user = User.objects.create(username='benchmark')
+            results = {}
+            for cost in costs:
+                with override_settings(**{cost_setting: cost}):
+                    User.objects.filter(id=user.id).update(password=hashers.make_password(PASSWORD))
+                    results[str(cost)] = self.run(options['requests'], options['concurrency'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        meta = {
+            'hasher': settings.PASSWORD_HASHER,
+            'hash_workers': settings.PASSWORD_HASH_WORKERS,
+            'cpus': os.cpu_count(),
+            **{key: options[key] for key in ('requests', 'concurrency')},
+        }
+        self.stdout.write(json.dumps({'meta': meta, 'costs': results}, indent=2))
+
+    def run(self, total, concurrency):
+        latencies, failures = [], 0
+        remaining = iter(range(total))
+        lock = threading.Lock()
+
+        def worker():
+            nonlocal failures
+            try:
+                while True:
+                    with lock:
+                        if next(remaining, None) is None:
+                            return
+
+                    started = time.perf_counter()
+                    user = authenticate(username='benchmark', password=PASSWORD)
+                    elapsed = time.perf_counter() - started
+
+                    with lock:
+                        latencies.append(elapsed * 1000)
+                        failures += user is None
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - started
+
+        return {
+            'logins': len(latencies),
+            'failures': failures,
+            'rps': round(len(latencies) / duration, 2),
+            'latency_ms': percentiles(latencies),
+        }
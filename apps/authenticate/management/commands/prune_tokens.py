@@ -0,0 +1,27 @@
+from django.core.management import BaseCommand
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired outstanding tokens and their blacklist entries in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='outstanding tokens deleted per query')
+
+    def handle(self, *args, **options):
+        now = aware_utcnow()
+        deleted = 0
+
+        while True:
+            ids = list(
+                OutstandingToken.objects.filter(expires_at__lte=now).order_by('id').values_list('id', flat=True)[
+                    :options['batch_size']
+                ]
+            )
+            if not ids:
+                break
+            # blacklisted rows go along through the cascade
+            deleted += OutstandingToken.objects.filter(id__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f'{deleted} expired token rows deleted'))
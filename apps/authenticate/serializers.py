@@ -3,8 +3,10 @@ from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from rest_framework_simplejwt.tokens import RefreshToken, TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.exceptions import TokenError
+from apps.authenticate import hashers
+from apps.authenticate.tokens import RefreshToken
 from apps.core.models import Wallet
 
 
@@ -28,12 +30,12 @@ class RegisterUserSerializer(serializers.ModelSerializer):
         return attrs
 
     def create(self, validated_data):
+        # hashed before the single insert, in the hashing pool
         user = User.objects.create(
             username=validated_data.get('username'),
             email=validated_data.get('email'),
+            password=hashers.make_password(validated_data['password']),
         )
-        user.set_password(validated_data['password'])
-        user.save()
 
         INITIAL_CREDIT = 100    # TODO: read from config instance
 
@@ -50,6 +52,10 @@ class LoginUserSerializer(TokenObtainPairSerializer):
         return token
 
 
+class RefreshSerializer(TokenRefreshSerializer):
+    token_class = RefreshToken
+
+
 class LogoutSerializer(serializers.Serializer):
     refresh = serializers.CharField()
 
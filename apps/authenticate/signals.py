@@ -0,0 +1,26 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from apps.authenticate.authentication import user_flags
+from apps.authenticate import tokens
+from apps.authenticate.tokens import blacklist_filter
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def add_to_blacklist_filter(sender, instance, created, **kwargs):
+    if created:
+        blacklist_filter.add(instance.token.jti)
+        # again once committed, another worker syncing before the commit does not see the row yet
+        tokens.invalidate()
+        transaction.on_commit(tokens.invalidate)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_user_flags(sender, instance, **kwargs):
+    # again once committed, a request reading the row before the commit stored it under the first new version
+    user_id = instance.pk
+    user_flags.invalidate(user_id)
+    transaction.on_commit(lambda: user_flags.invalidate(user_id))
@@ -1,10 +1,29 @@
+import os
+import tempfile
+
+from io import StringIO
+from datetime import timedelta
 from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.conf import settings
+from django.db import connection
+from django.test import AsyncRequestFactory, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework.reverse import reverse
 from rest_framework import status
 from mixer.backend.django import mixer
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken, BlacklistedToken
+from apps.authenticate import hashers
+from apps.authenticate.authentication import ClaimsUser, user_flags
+from apps.authenticate.tokens import BloomFilter, blacklist_filter
+from apps.core.models import App
+from apps.core.views import AsyncAppViewsets
 
 
+# the suite registers and logs in far more often than the production rates allow
+@override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}})
 class WithAuthTestCase(APITestCase):
     register_url = reverse('auth_register')
     login_url = reverse('token_obtain_pair')
@@ -66,6 +85,29 @@ class TestLoginCase(WithAuthTestCase):
         self.assertTrue('access' in tokens)
         self.assertTrue('refresh' in tokens)
 
+    @override_settings(PASSWORD_HASH_ITERATIONS=1000)
+    def test_register_hashes_before_insert(self):
+        with CaptureQueriesContext(connection) as captured:
+            code, _ = self.auth_request(self.register_url, self.data)
+
+        self.assertEqual(code, status.HTTP_201_CREATED)
+        self.assertFalse([query for query in captured if query['sql'].startswith('UPDATE')])
+        self.assertTrue(User.objects.get(username=self.data['username']).password.startswith('pbkdf2_sha256$1000$'))
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=1000, PASSWORD_HASH_WORKERS=0)
+    def test_rehash_on_login(self):
+        self.auth_request(self.register_url, self.data)
+
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            code, _ = self.auth_request(self.login_url, self.data)
+            self.assertEqual(code, status.HTTP_200_OK)
+            self.assertTrue(User.objects.get(username=self.data['username']).password.startswith('pbkdf2_sha256$2000$'))
+            code, _ = self.auth_request(self.login_url, self.data)
+
+        self.assertEqual(code, status.HTTP_200_OK)
+        code, _ = self.auth_request(self.login_url, {**self.data, 'password': 'wrong-password'})
+        self.assertEqual(code, status.HTTP_401_UNAUTHORIZED)
+
     def test_logout(self):
         tokens = self.get_token(self.data)
 
@@ -78,3 +120,171 @@ class TestLoginCase(WithAuthTestCase):
         self.assertEqual(ok, status.HTTP_204_NO_CONTENT)
         self.assertEqual(err, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(expired, status.HTTP_400_BAD_REQUEST)
+
+    def test_refresh_after_logout(self):
+        tokens = self.get_token(self.data)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"JWT {tokens['access']}")
+        self.auth_request(self.logout_url, {'refresh': tokens['refresh']})
+        code, _ = self.auth_request(self.token_refresh, {'refresh': tokens['refresh']})
+
+        self.assertEqual(code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(TOKEN_BLACKLIST_SYNC_INTERVAL=3600)
+    def test_refresh_skips_blacklist_query(self):
+        tokens = self.get_token(self.data)
+        blacklist_filter.warm()
+
+        with self.assertNumQueries(0):
+            code, body = self.auth_request(self.token_refresh, {'refresh': tokens['refresh']})
+
+        self.assertEqual(code, status.HTTP_200_OK)
+        self.assertTrue('refresh' in body)
+
+    @override_settings(TOKEN_BLACKLIST_SYNC_INTERVAL=3600)
+    def test_refresh_after_logout_elsewhere(self):
+        tokens = self.get_token(self.data)
+        blacklist_filter.warm()
+        bits = bytes(blacklist_filter.filter.bits)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"JWT {tokens['access']}")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.auth_request(self.logout_url, {'refresh': tokens['refresh']})
+        # the filter of a worker which synced before the logout
+        blacklist_filter.filter.bits = bytearray(bits)
+
+        code, _ = self.auth_request(self.token_refresh, {'refresh': tokens['refresh']})
+
+        self.assertEqual(code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_blacklist_filter_count(self):
+        tokens = self.get_token(self.data)
+        self.client.credentials(HTTP_AUTHORIZATION=f"JWT {tokens['access']}")
+        self.auth_request(self.logout_url, {'refresh': tokens['refresh']})
+        blacklist_filter.warm()
+
+        # the overlap re-reads the blacklisted rows on every sync, they are counted once
+        for _ in range(3):
+            blacklist_filter.sync(force=True)
+        self.assertEqual(blacklist_filter.count, BlacklistedToken.objects.count())
+
+    def test_throttled_login(self):
+        self.auth_request(self.register_url, self.data)
+        rates = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'login': '2/min'}}
+
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(REST_FRAMEWORK=rates, THROTTLE_STORE=os.path.join(directory, 'throttle.sqlite3')):
+            codes = [self.auth_request(self.login_url, self.data)[0] for _ in range(3)]
+            response = self.client.post(self.login_url, data=self.data)
+            # other scopes keep their own buckets
+            code, _ = self.auth_request(self.register_url, self.data)
+
+        self.assertEqual(codes, [status.HTTP_200_OK, status.HTTP_200_OK, status.HTTP_429_TOO_MANY_REQUESTS])
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertTrue(0 < int(response['Retry-After']) <= 30)
+        self.assertEqual(code, status.HTTP_400_BAD_REQUEST)
+
+    def test_prune_tokens(self):
+        tokens = self.get_token(self.data)
+        self.client.credentials(HTTP_AUTHORIZATION=f"JWT {tokens['access']}")
+        self.auth_request(self.logout_url, {'refresh': tokens['refresh']})
+        OutstandingToken.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        call_command('prune_tokens', batch_size=1, stdout=StringIO())
+
+        self.assertFalse(OutstandingToken.objects.exists())
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class TestClaimsAuthentication(WithAuthTestCase):
+    def setUp(self) -> None:
+        user_flags.clear()
+
+        with mixer.ctx(commit=False) as mx:
+            user = mx.blend(User, active=True)
+            tokens = self.get_token({
+                'username': user.username,
+                'email': user.email,
+                'password': user.password,
+                'password_confirmation': user.password,
+            })
+
+        self.user = User.objects.get(username=user.username)
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {tokens["access"]}')
+
+    def test_no_user_query(self):
+        mixer.blend(App, user=self.user)
+
+        with self.assertNumQueries(3):
+            self.client.get('/api/apps/')
+        # only the count and the page, the flags of the user are cached
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/apps/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(response.wsgi_request.user, ClaimsUser)
+        self.assertEqual(response.wsgi_request.user.id, self.user.id)
+
+    def test_deactivation(self):
+        self.assertEqual(self.client.get('/api/apps/').status_code, status.HTTP_200_OK)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get('/api/apps/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_staff_flag(self):
+        self.assertEqual(self.client.get('/api/stats/').status_code, status.HTTP_403_FORBIDDEN)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get('/api/stats/').status_code, status.HTTP_200_OK)
+
+        # QuerySet.update() sends no signal, the updater invalidates
+        User.objects.filter(id=self.user.id).update(is_staff=False)
+        user_flags.invalidate(self.user.id)
+        self.assertEqual(self.client.get('/api/stats/').status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_outdated_entry(self):
+        self.assertEqual(user_flags.load(self.user.id), (True, False, False))
+        _, version = user_flags.get(self.user.id)
+
+        # read before a deactivation, stored after its invalidation
+        self.user.is_active = False
+        self.user.save()
+        user_flags.set(self.user.id, version, (True, False, False))
+
+        self.assertEqual(user_flags.get(self.user.id)[0], None)
+        self.assertEqual(self.client.get('/api/apps/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_async_views(self):
+        headers = {'Authorization': self.client._credentials['HTTP_AUTHORIZATION']}
+        response = await AsyncAppViewsets.as_view({'get': 'list'})(AsyncRequestFactory().get('/apps/', headers=headers))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(response.renderer_context['request'].user, ClaimsUser)
+
+    def test_deleted_user(self):
+        self.user.delete()
+        self.assertEqual(self.client.get('/api/apps/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TestBloomFilter(SimpleTestCase):
+    def test_membership(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        members = [f'jti-{i}' for i in range(1000)]
+        for member in members:
+            bloom.add(member)
+
+        self.assertTrue(all(member in bloom for member in members))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class TestHashingPool(SimpleTestCase):
+    def test_workers_setting(self):
+        with override_settings(PASSWORD_HASH_WORKERS=1):
+            self.assertEqual(hashers.get_executor()._max_workers, 1)
+        with override_settings(PASSWORD_HASH_WORKERS=3):
+            self.assertEqual(hashers.get_executor()._max_workers, 3)
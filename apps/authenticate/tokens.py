@@ -0,0 +1,155 @@
+import math
+import time
+import hashlib
+import threading
+
+from uuid import uuid4
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+
+CACHE_ALIAS = 'token_blacklist'
+
+VERSION_KEY = 'blacklist:version'
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def current_version():
+    return get_cache().get(VERSION_KEY)
+
+
+def invalidate():
+    """Tells the filters of every worker sharing the cache that a token was blacklisted"""
+
+    get_cache().set(VERSION_KEY, uuid4().hex, timeout=None)
+
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big')
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+
+class BlacklistFilter:
+    """
+    Per-process Bloom filter of blacklisted JTIs. Tokens blacklisted by this process are added through
+    signals, the ones blacklisted by other workers are picked up every TOKEN_BLACKLIST_SYNC_INTERVAL seconds.
+
+    Blacklisting a token also sets a new version in the ``token_blacklist`` cache, a token missing from
+    the filter is only trusted while the version is the one of the last sync. With a cache shared between
+    workers (TOKEN_BLACKLIST_CACHE_BACKEND) a logout is refused everywhere at once, with the default
+    per-process cache the other workers accept the token for up to TOKEN_BLACKLIST_SYNC_INTERVAL seconds.
+    """
+
+    # ids are allocated before commit, re-read a few of them so late commits are not skipped
+    SYNC_OVERLAP = 1000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # the filter and the version it is complete for, replaced together so readers never pair
+        # a filter with a version newer than its rows
+        self.state = (None, None)
+        self.count = 0
+        self.last_id = 0
+        self.synced_at = 0
+
+    @property
+    def filter(self):
+        return self.state[0]
+
+    @property
+    def version(self):
+        return self.state[1]
+
+    def load(self, bloom, rows, last_id):
+        """Adds the rows to ``bloom``, returns how many of them follow ``last_id`` and the highest id"""
+
+        added = 0
+        for row_id, jti in rows:
+            bloom.add(jti)
+            # the overlap re-reads rows counted by the previous sync
+            if row_id > last_id:
+                added += 1
+            last_id = max(last_id, row_id)
+        return added, last_id
+
+    def warm(self):
+        with self.lock:
+            # read before the rows, a token blacklisted meanwhile sets a newer one
+            version = current_version()
+            capacity = max(settings.TOKEN_BLACKLIST_FILTER_CAPACITY, BlacklistedToken.objects.count() * 2)
+            bloom = BloomFilter(capacity, settings.TOKEN_BLACKLIST_FILTER_ERROR_RATE)
+            # filled aside, lookups keep reading the previous filter meanwhile
+            count, last_id = self.load(bloom, BlacklistedToken.objects.values_list('id', 'token__jti').iterator(), 0)
+
+            self.count, self.last_id = count, last_id
+            self.state = (bloom, version)
+            self.synced_at = time.monotonic()
+
+    def sync(self, force=False):
+        if self.filter is None:
+            return self.warm()
+
+        if not force and time.monotonic() - self.synced_at < settings.TOKEN_BLACKLIST_SYNC_INTERVAL:
+            return
+
+        if self.count > self.filter.capacity:
+            return self.warm()
+
+        with self.lock:
+            version = current_version()
+            bloom = self.filter
+            rows = BlacklistedToken.objects.filter(id__gt=self.last_id - self.SYNC_OVERLAP)
+            added, self.last_id = self.load(bloom, rows.values_list('id', 'token__jti'), self.last_id)
+
+            self.count += added
+            self.state = (bloom, version)
+            self.synced_at = time.monotonic()
+
+    def add(self, jti):
+        if self.filter is not None:
+            # counted by the next sync, which reads its row past last_id
+            with self.lock:
+                self.filter.add(jti)
+
+    def might_contain(self, jti):
+        self.sync()
+        bloom, version = self.state
+        if jti in bloom:
+            return True
+
+        # a negative answer is only as recent as the last sync, catch up when a token was blacklisted since
+        if current_version() != version:
+            self.sync(force=True)
+            return jti in self.filter
+        return False
+
+
+blacklist_filter = BlacklistFilter()
+
+
+class RefreshToken(tokens.RefreshToken):
+    def check_blacklist(self):
+        # the filter has no false negatives, only its positives need the database
+        if blacklist_filter.might_contain(self.payload[api_settings.JTI_CLAIM]):
+            super().check_blacklist()
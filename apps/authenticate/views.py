@@ -5,7 +5,8 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from drf_yasg.utils import swagger_auto_schema
-from apps.authenticate.serializers import RegisterUserSerializer, LoginUserSerializer, LogoutSerializer
+from apps.authenticate.serializers import RegisterUserSerializer, LoginUserSerializer, LogoutSerializer, \
+    RefreshSerializer
 from appstore.utils import CustomSchemes
 
 
@@ -13,11 +14,13 @@ class RegisterUserView(CreateAPIView):
     queryset = User.objects.all()
     permission_classes = (AllowAny,)
     serializer_class = RegisterUserSerializer
+    throttle_scope = 'register'
 
     @swagger_auto_schema(
         operation_description='Signup new user',
         responses={
-            status.HTTP_201_CREATED: CustomSchemes.user
+            status.HTTP_201_CREATED: CustomSchemes.user,
+            status.HTTP_429_TOO_MANY_REQUESTS: CustomSchemes.error
         },
         operation_id="register"
     )
@@ -28,11 +31,13 @@ class RegisterUserView(CreateAPIView):
 class LoginUserView(TokenObtainPairView):
     permission_classes = (AllowAny,)
     serializer_class = LoginUserSerializer
+    throttle_scope = 'login'
 
     @swagger_auto_schema(
         operation_description='Login',
         responses={
             status.HTTP_200_OK: CustomSchemes.token_pair,
+            status.HTTP_429_TOO_MANY_REQUESTS: CustomSchemes.error
         },
         operation_id="login"
     )
@@ -41,6 +46,8 @@ class LoginUserView(TokenObtainPairView):
 
 
 class RefreshTokenView(TokenRefreshView):
+    serializer_class = RefreshSerializer
+
     @swagger_auto_schema(
         operation_description='Refresh access token',
         responses={
@@ -0,0 +1,127 @@
+import time
+import hashlib
+import threading
+
+from datetime import timedelta
+from django.conf import settings
+from apps.core import entitlements
+from apps.core.models import App
+
+
+def digest(access_key):
+    return hashlib.sha256(str(access_key).encode()).digest()
+
+
+class AccessKeyIndex:
+    """
+    Per-process map of the access key digests to their app and its owner. Apps saved or deleted by this
+    process are applied through signals once committed, the ones changed by other workers are read every
+    ACCESS_INDEX_SYNC_INTERVAL seconds. Deletions leave no row to read, the sync also counts the apps and
+    rebuilds the index when it holds more of them than the table, so apps deleted by other workers are
+    dropped within the same interval. Every ACCESS_INDEX_RELOAD_INTERVAL seconds the index is rebuilt anyway.
+
+    Keys are looked up by their sha256 digest, so the time of a lookup says nothing about how much of a
+    guessed key matched.
+    """
+
+    # updated_at is set before commit, re-read a few seconds of it so late commits are not skipped
+    SYNC_OVERLAP = timedelta(seconds=30)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.apps = None
+        self.digests = {}
+        self.synced_at = self.loaded_at = 0
+        self.last_updated_at = None
+
+    def put(self, apps, digests, app_id, access_key, owner_id):
+        key = digest(access_key)
+        previous = digests.get(app_id)
+        if previous is not None and previous != key:
+            apps.pop(previous, None)
+        apps[key] = (app_id, owner_id)
+        digests[app_id] = key
+
+    def load(self, rows, apps, digests):
+        for app_id, access_key, owner_id, updated_at in rows:
+            self.put(apps, digests, app_id, access_key, owner_id)
+            if self.last_updated_at is None or updated_at > self.last_updated_at:
+                self.last_updated_at = updated_at
+        self.synced_at = time.monotonic()
+
+    def rows(self):
+        return App.objects.values_list('id', 'access_key', 'user', 'updated_at')
+
+    def reload(self):
+        # filled aside, lookups keep reading the previous maps meanwhile
+        apps, digests, self.last_updated_at = {}, {}, None
+        self.load(self.rows().iterator(), apps, digests)
+        self.apps, self.digests = apps, digests
+        self.loaded_at = self.synced_at
+
+    def warm(self):
+        with self.lock:
+            self.reload()
+
+    def stale(self):
+        return self.apps is None or time.monotonic() - self.loaded_at >= settings.ACCESS_INDEX_RELOAD_INTERVAL
+
+    def behind(self):
+        return time.monotonic() - self.synced_at >= settings.ACCESS_INDEX_SYNC_INTERVAL
+
+    def sync(self):
+        if not self.stale() and not self.behind():
+            return
+
+        with self.lock:
+            # checked again, the threads which waited on the lock find the work done
+            if self.stale():
+                self.reload()
+            elif self.behind():
+                rows = self.rows()
+                if self.last_updated_at is not None:
+                    rows = rows.filter(updated_at__gte=self.last_updated_at - self.SYNC_OVERLAP)
+                self.load(rows, self.apps, self.digests)
+                if len(self.digests) > App.objects.count():
+                    self.reload()
+
+    def add(self, app_id, access_key, owner_id):
+        if self.apps is not None:
+            with self.lock:
+                self.put(self.apps, self.digests, app_id, access_key, owner_id)
+
+    def remove(self, app_id):
+        if self.apps is not None:
+            with self.lock:
+                key = self.digests.pop(app_id, None)
+                if key is not None:
+                    self.apps.pop(key, None)
+
+    def reset(self):
+        with self.lock:
+            self.apps = None
+
+    def lookup(self, access_key):
+        """(app id, owner id) of the app with ``access_key``, None for unknown keys"""
+
+        self.sync()
+        return self.apps.get(digest(access_key))
+
+
+access_index = AccessKeyIndex()
+
+
+def verify(access_key, user_id):
+    """
+    Whether the user may use the app of ``access_key``, as its owner or a buyer, and the app id. The id
+    is only told to users allowed, the key alone does not reveal which app it opens.
+    """
+
+    found = access_index.lookup(access_key)
+    if found is None:
+        return False, None
+
+    app_id, owner_id = found
+    if owner_id == user_id or app_id in entitlements.owned(user_id):
+        return True, app_id
+    return False, None
@@ -0,0 +1,177 @@
+import hashlib
+
+from uuid import uuid4
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Window
+from django.db.models.functions import RowNumber
+from apps.core.models import App
+from apps.core.search import search_apps
+from apps.core.serializers import AppListSerializer
+
+
+CACHE_ALIAS = 'catalogue'
+
+VERSION_KEY = 'verified:version'
+HITS_KEY = 'verified:hits'
+MISSES_KEY = 'verified:misses'
+
+# Fields rendered by AppListSerializer(scope='public') plus the owner used for the exclusion
+CATALOGUE_FIELDS = ('verified', 'title', 'description', 'price', 'icon', 'user_id')
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def invalidate():
+    """Orphans every cached block, they expire with the cache timeout"""
+
+    get_cache().set(VERSION_KEY, uuid4().hex, timeout=None)
+
+
+def current_version(cache):
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid4().hex, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def count_lookup(cache, hit):
+    key = HITS_KEY if hit else MISSES_KEY
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def stats():
+    cache = get_cache()
+    hits, misses = cache.get(HITS_KEY, 0), cache.get(MISSES_KEY, 0)
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / lookups if lookups else None,
+    }
+
+
+class VerifiedCatalogue:
+    """
+    Sequence of public AppListSerializer payloads of verified apps, read through the cache.
+
+    The listing is cached in blocks of PAGE_SIZE rows per search term and shared by every user, next to
+    its count. The apps of the requesting user are skipped after the lookup, their positions in the
+    listing, cached per term and user, tell which blocks hold the requested rows. Suitable as the object
+    list of django's Paginator, each slice counts as one cache hit or miss.
+    """
+
+    def __init__(self, term, user_id):
+        self.cache = get_cache()
+        self.term = term or ''
+        self.user_id = user_id
+        self.block_size = settings.PAGE_SIZE
+        self.version = current_version(self.cache)
+        self.missed = self.counted = False
+        self._own_positions = None
+
+    def key(self, *parts):
+        term = hashlib.sha1(self.term.encode()).hexdigest()
+        return ':'.join(map(str, ('verified', self.version, term, self.block_size, *parts)))
+
+    def lookup(self, key, compute):
+        value = self.cache.get(key)
+
+        if value is None:
+            self.missed = True
+            value = compute()
+            self.cache.set(key, value)
+
+        return value
+
+    def record(self):
+        # once per request, a hit when every entry it read was cached
+        if not self.counted:
+            self.counted = True
+            count_lookup(self.cache, hit=not self.missed)
+
+    def get_queryset(self):
+        # a miss is stored under the current version, a lagging replica would keep serving it after the save
+        qs = App.objects.using(DEFAULT_DB_ALIAS).filter(verified=True)
+        if self.term:
+            qs = search_apps(qs, self.term)
+        return qs
+
+    def own_positions_query(self):
+        # most users own no verified app, the (user, id) index tells without ranking the listing
+        if not App.objects.using(DEFAULT_DB_ALIAS).filter(verified=True, user=self.user_id).exists():
+            return []
+
+        qs = self.get_queryset()
+        ordering = qs.query.order_by or App._meta.ordering
+        ranked = qs.annotate(position=Window(RowNumber(), order_by=list(ordering))).values_list('position', 'user_id')
+
+        # filtered outside, a filter on the queryset would be applied before the rows are numbered
+        sql, params = ranked.query.get_compiler(using=ranked.db).as_sql()
+        with connections[ranked.db].cursor() as cursor:
+            cursor.execute(
+                f'SELECT "position" FROM ({sql}) ranked WHERE "user_id" = %s ORDER BY "position"',
+                (*params, self.user_id)
+            )
+            return [position - 1 for position, in cursor.fetchall()]
+
+    @property
+    def own_positions(self):
+        """Positions of the requester's apps in the listing"""
+
+        if self._own_positions is None:
+            self._own_positions = self.lookup(
+                self.key('owner', self.user_id), self.own_positions_query
+            ) if self.user_id else []
+        return self._own_positions
+
+    def block(self, number):
+        def compute():
+            offset = number * self.block_size
+            qs = AppListSerializer.prepare(self.get_queryset())[offset:offset + self.block_size]
+            return AppListSerializer(qs, context={'scope': 'public'}).data
+
+        return self.lookup(self.key('block', number), compute)
+
+    def count(self):
+        return self.lookup(self.key('count'), self.get_queryset().count) - len(self.own_positions)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError('VerifiedCatalogue only supports slicing')
+
+        start, stop = index.start or 0, index.stop
+        own_positions = self.own_positions
+
+        # position in the listing of the first requested row, shifted by the requester's apps before it
+        first = start
+        for position in own_positions:
+            if position > first:
+                break
+            first += 1
+
+        skipped = set(own_positions)
+        results, number = [], first // self.block_size
+        while len(results) < stop - start:
+            rows = self.block(number)
+            for position, row in enumerate(rows, number * self.block_size):
+                if position >= first and position not in skipped:
+                    results.append(row)
+                    if len(results) == stop - start:
+                        break
+            if len(rows) < self.block_size:
+                break
+            number += 1
+
+        self.record()
+        return results
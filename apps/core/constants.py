@@ -3,3 +3,21 @@ USD = 1
 WALLET_UNITS = (
     (USD, 'USD'),
 )
+
+DEBIT = 1
+CREDIT = 2
+
+LEDGER_ENTRY_KINDS = (
+    (DEBIT, 'Debit'),
+    (CREDIT, 'Credit'),
+)
+
+ICON_PENDING = 'pending'
+ICON_READY = 'ready'
+ICON_FAILED = 'failed'
+
+ICON_STATUSES = (
+    (ICON_PENDING, 'Pending'),
+    (ICON_READY, 'Ready'),
+    (ICON_FAILED, 'Failed'),
+)
@@ -0,0 +1,63 @@
+from uuid import uuid4
+from django.core.cache import caches
+from django.db import transaction
+from apps.core.models import Purchase
+
+
+CACHE_ALIAS = 'entitlements'
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def cache_keys(user_id):
+    return f'owned:{user_id}', f'owned:version:{user_id}'
+
+
+def load(user_id):
+    return frozenset(
+        Purchase.objects.filter(issued_by=user_id, app__isnull=False).values_list('app', flat=True).distinct()
+    )
+
+
+def owned(user_id):
+    """
+    Ids of the apps bought by the user, read through the cache. The ids are stored with the version of
+    the user, a purchase sets a new one once committed, so ids read before it are never served after it.
+    """
+
+    cache = get_cache()
+    key, version_key = cache_keys(user_id)
+    found = cache.get_many([key, version_key])
+    entry, version = found.get(key), found.get(version_key)
+    if entry is not None and version is not None and entry[0] == version:
+        return entry[1]
+
+    if version is None:
+        cache.add(version_key, uuid4().hex, timeout=None)
+        version = cache.get(version_key)
+    app_ids = load(user_id)
+    cache.set(key, (version, app_ids))
+    return app_ids
+
+
+def check(user_id, app_ids):
+    """Splits ``app_ids`` into the owned and the not owned ones"""
+
+    app_ids, owned_ids = set(app_ids), owned(user_id)
+    return app_ids & owned_ids, app_ids - owned_ids
+
+
+def owned_among(user_id, app_ids):
+    """Apps of ``app_ids`` the user already bought, read from the database for the purchase paths"""
+
+    return set(Purchase.objects.filter(issued_by=user_id, app__in=app_ids).values_list('app', flat=True))
+
+
+def invalidate(user_id):
+    get_cache().set(cache_keys(user_id)[1], uuid4().hex, timeout=None)
+
+
+def invalidate_on_commit(user_id):
+    transaction.on_commit(lambda: invalidate(user_id), robust=True)
@@ -1,5 +1,6 @@
 from rest_framework.exceptions import APIException
-from rest_framework.status import HTTP_402_PAYMENT_REQUIRED, HTTP_400_BAD_REQUEST
+from rest_framework.status import HTTP_402_PAYMENT_REQUIRED, HTTP_400_BAD_REQUEST, HTTP_409_CONFLICT, \
+    HTTP_422_UNPROCESSABLE_ENTITY
 
 
 class InsufficientFundException(APIException):
@@ -10,3 +11,13 @@ class InsufficientFundException(APIException):
 class SelfPurchaseException(APIException):
     status_code = HTTP_400_BAD_REQUEST
     default_detail = 'Unable to process. Purchasing your own product is not allowed.'
+
+
+class IdempotencyKeyMismatchException(APIException):
+    status_code = HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'Unable to process. This Idempotency-Key was already used for a different request.'
+
+
+class DuplicatePurchaseException(APIException):
+    status_code = HTTP_409_CONFLICT
+    default_detail = 'Unable to process. You already own this app.'
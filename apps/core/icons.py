@@ -0,0 +1,136 @@
+import io
+import os
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction, IntegrityError
+from apps.core.constants import ICON_READY, ICON_FAILED
+from apps.core.models import IconBlob, UploadedIcon
+from apps.core.uploads import file_digest
+
+
+logger = logging.getLogger(__name__)
+
+RENDITION_FORMATS = ('webp', 'png')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.ICON_WORKERS, thread_name_prefix='icons')
+    return _executor
+
+
+def rendition_dir(name):
+    return os.path.splitext(name)[0]
+
+
+def render(name):
+    """Writes every size and format of the stored icon next to it, returns their urls by size and format"""
+
+    base = rendition_dir(name)
+    renditions = {}
+
+    with default_storage.open(name) as source, Image.open(source) as image:
+        image = image.convert('RGBA')
+
+        for size in settings.ICON_RENDITION_SIZES:
+            thumbnail = image.copy()
+            thumbnail.thumbnail((size, size))
+
+            for image_format in RENDITION_FORMATS:
+                buffer = io.BytesIO()
+                thumbnail.save(buffer, image_format)
+                path = f'{base}/{size}.{image_format}'
+                if default_storage.exists(path):
+                    default_storage.delete(path)
+                default_storage.save(path, ContentFile(buffer.getvalue()))
+                renditions.setdefault(str(size), {})[image_format] = default_storage.url(path)
+
+    return renditions
+
+
+def delete_files(blob):
+    base = rendition_dir(blob.file.name)
+
+    try:
+        _, renditions = default_storage.listdir(base)
+    except FileNotFoundError:
+        renditions = []
+
+    for rendition in renditions:
+        default_storage.delete(f'{base}/{rendition}')
+    blob.file.delete(save=False)
+
+
+def process(blob_id):
+    blob = IconBlob.objects.get(id=blob_id)
+
+    try:
+        renditions = render(blob.file.name)
+    except Exception:
+        logger.exception('failed to render icon blob #%s', blob_id)
+        IconBlob.objects.filter(id=blob_id).update(status=ICON_FAILED)
+    else:
+        IconBlob.objects.filter(id=blob_id).update(status=ICON_READY, renditions=renditions)
+
+
+def process_in_worker(blob_id):
+    try:
+        process(blob_id)
+    except Exception:
+        logger.exception('icon worker crashed on blob #%s', blob_id)
+    finally:
+        close_old_connections()
+
+
+def schedule(blob):
+    """Renders the blob once it is committed, inline when ICON_WORKERS is 0"""
+
+    if settings.ICON_WORKERS:
+        transaction.on_commit(lambda: get_executor().submit(process_in_worker, blob.id))
+    else:
+        transaction.on_commit(lambda: process(blob.id))
+
+
+def attach(blob, user_id):
+    icon = UploadedIcon.objects.create(user_id=user_id, blob=blob, file=blob.file.name)
+    icon.blob = blob
+    return icon
+
+
+def store(upload, user_id):
+    """Saves an uploaded icon, the bytes are written and rendered only the first time their digest shows up"""
+
+    digest = file_digest(upload)
+
+    with transaction.atomic():
+        # locked until the upload refers to it, collect_icon_blobs checks the references under the same lock
+        blob = IconBlob.objects.select_for_update().filter(digest=digest).first()
+        if blob is not None:
+            return attach(blob, user_id)
+
+    blob = IconBlob(digest=digest, size=upload.size)
+    blob.file.save(upload.name, upload, save=False)
+
+    try:
+        with transaction.atomic():
+            blob.save()
+    except IntegrityError:
+        # a concurrent upload of the same bytes got there first, too recent for collect_icon_blobs
+        blob.file.delete(save=False)
+        blob = IconBlob.objects.get(digest=digest)
+    else:
+        schedule(blob)
+
+    return attach(blob, user_id)
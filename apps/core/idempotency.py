@@ -0,0 +1,69 @@
+import json
+import hashlib
+
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+from apps.core.exceptions import IdempotencyKeyMismatchException
+from apps.core.models import IdempotencyKey
+
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAY_HEADER = 'Idempotency-Replayed'
+
+
+def fingerprint(request):
+    payload = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path} {payload}'.encode()).hexdigest()
+
+
+def idempotent(view_method):
+    """
+    Records the response of the first completed request carrying an Idempotency-Key header and replays it
+    to the retries of the same user. The key row stays locked while the first attempt runs, so concurrent
+    duplicates wait for it instead of running the view again.
+    """
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.META.get(HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+
+        if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            raise ValidationError({'detail': 'Idempotency-Key is too long'})
+
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+        request_fingerprint = fingerprint(request)
+
+        with transaction.atomic():
+            record, created = IdempotencyKey.objects.select_for_update().get_or_create(
+                user_id=request.user.id,
+                key=key,
+                defaults={'fingerprint': request_fingerprint, 'expires_at': expires_at}
+            )
+
+            if not created and record.expires_at > now:
+                if record.fingerprint != request_fingerprint:
+                    raise IdempotencyKeyMismatchException()
+                return Response(status=record.status_code, data=record.response, headers={REPLAY_HEADER: 'true'})
+
+            try:
+                response = view_method(self, request, *args, **kwargs)
+            except APIException as exc:
+                response = self.handle_exception(exc)
+
+            record.fingerprint = request_fingerprint
+            record.expires_at = expires_at
+            record.status_code = response.status_code
+            record.response = response.data
+            record.save()
+
+        return response
+
+    return wrapper
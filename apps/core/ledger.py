@@ -0,0 +1,81 @@
+import random
+
+from collections import defaultdict
+from django.conf import settings
+from django.db.models import F
+from apps.core.constants import DEBIT, CREDIT
+from apps.core.models import Wallet, WalletShard, LedgerEntry
+
+
+def lock_wallet(user_id):
+    return Wallet.objects.select_for_update().filter(user=user_id).first()
+
+
+def fold(wallet):
+    """Moves the shard credits into the balance of a wallet locked by the current transaction"""
+
+    shards = list(WalletShard.objects.filter(wallet=wallet).exclude(balance=0).values_list('id', 'balance'))
+
+    for shard_id, amount in shards:
+        # subtract what was read, credits landing in between stay in the shard
+        WalletShard.objects.filter(id=shard_id).update(balance=F('balance') - amount)
+
+    amount = sum(amount for _, amount in shards)
+    if amount:
+        Wallet.objects.filter(id=wallet.id).update(balance=F('balance') + amount)
+        wallet.balance += amount
+
+    return amount
+
+
+def reserve(wallet, amount):
+    """Whether a locked wallet can pay amount, credits are folded in only when the balance falls short"""
+
+    if wallet is None:
+        return False
+    if wallet.balance < amount:
+        fold(wallet)
+    return wallet.balance >= amount
+
+
+def seller_wallets(user_ids):
+    return dict(Wallet.objects.filter(user__in=set(user_ids)).values_list('user', 'id'))
+
+
+def credit(wallet_id, amount):
+    index = random.randrange(settings.WALLET_SHARDS)
+    shard = WalletShard.objects.filter(wallet=wallet_id, index=index)
+
+    if not shard.update(balance=F('balance') + amount):
+        WalletShard.objects.get_or_create(wallet_id=wallet_id, index=index)
+        shard.update(balance=F('balance') + amount)
+
+
+def settle(wallet, purchases):
+    """Debits the locked buyer wallet and credits the sellers of the purchased apps, one entry per movement"""
+
+    sellers = seller_wallets(purchase.app.user_id for purchase in purchases)
+    credits = defaultdict(float)
+    entries = []
+
+    for purchase in purchases:
+        entries.append(
+            LedgerEntry(wallet=wallet, purchase=purchase, kind=DEBIT, amount=purchase.price, unit=purchase.unit)
+        )
+
+        seller_wallet = sellers.get(purchase.app.user_id)
+        if seller_wallet:
+            credits[seller_wallet] += purchase.price
+            entries.append(
+                LedgerEntry(
+                    wallet_id=seller_wallet, purchase=purchase, kind=CREDIT, amount=purchase.price, unit=purchase.unit
+                )
+            )
+
+    wallet.balance -= sum(purchase.price for purchase in purchases)
+    wallet.save(update_fields=['balance'])
+
+    LedgerEntry.objects.bulk_create(entries)
+
+    for seller_wallet, amount in credits.items():
+        credit(seller_wallet, amount)
@@ -0,0 +1,290 @@
+import json
+import math
+import random
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+
+from collections import Counter
+from contextlib import nullcontext
+from io import BytesIO
+from PIL import Image
+from faker import Faker
+from mixer.backend.django import mixer
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from apps.core import icons
+from apps.core.models import App, Purchase, Wallet
+
+ENDPOINTS = (
+    'register', 'login', 'refresh', 'apps', 'verified', 'purchase_create', 'purchase_list', 'upload',
+)
+PASSWORD = 'Benchmark-Passw0rd'
+
+# endpoints which only read, the others write to the database
+READ_ENDPOINTS = {'apps', 'verified', 'purchase_list'}
+
+
+class Scenario:
+    """Seeded users, apps and tokens shared by the benchmark clients"""
+
+    def __init__(self, users, apps, words, rng):
+        self.users = users
+        self.apps = apps
+        self.words = words
+        self.rng = rng
+        self.tokens = {}
+        self.lock = threading.Lock()
+        self.counter = 0
+
+    def next_id(self):
+        with self.lock:
+            self.counter += 1
+            return self.counter
+
+    def choice(self, seq):
+        with self.lock:
+            return self.rng.choice(seq)
+
+
+class Command(BaseCommand):
+    help = 'Seeds a throwaway database and reports latency, throughput and SQL query counts per endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--apps', type=int, default=500)
+        parser.add_argument('--purchases', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=200, help='requests sent to every endpoint')
+        parser.add_argument('--concurrency', type=int, default=4, help='clients sending requests in parallel')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=ENDPOINTS)
+        parser.add_argument('--output', default='-', help='file the JSON report is written to, - for stdout')
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 or options['apps'] < 1:
+            raise CommandError('at least 2 users and 1 app are needed')
+
+        old_name = self.create_database()
+        setup_test_environment()
+
+        try:
+            # the clients share one address and a few users, the throttles would answer most requests
+            unthrottled = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}
+            with tempfile.TemporaryDirectory() as media_root, \
+                    override_settings(MEDIA_ROOT=media_root, REST_FRAMEWORK=unthrottled):
+                caches['catalogue'].clear()
+                scenario = self.seed(options)
+                results = {
+                    name: self.run(name, scenario, options['requests'], options['concurrency'])
+                    for name in options['endpoints']
+                }
+                # let the icon workers finish before the media directory and the database go away
+                icons.get_executor().shutdown(wait=True)
+        finally:
+            teardown_test_environment()
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = json.dumps({'meta': self.meta(options), 'endpoints': results}, indent=2)
+
+        if options['output'] == '-':
+            self.stdout.write(report)
+        else:
+            with open(options['output'], 'w') as f:
+                f.write(report)
+            self.stdout.write(self.style.SUCCESS(f'Report written to {options["output"]}'))
+
+    def create_database(self):
+        old_name = connection.settings_dict['NAME']
+
+        # clients run in their own threads, an in-memory SQLite database would not be shared with them
+        if connection.vendor == 'sqlite':
+            if not connection.settings_dict['TEST'].get('NAME'):
+                connection.settings_dict['TEST']['NAME'] = f'{tempfile.gettempdir()}/appstore_benchmark.sqlite3'
+            connection.settings_dict['OPTIONS'].setdefault('timeout', 30)
+
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        if connection.vendor == 'sqlite':
+            # readers no longer block the writer, the mode is kept in the file for every connection
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA journal_mode=WAL')
+        return old_name
+
+    def seed(self, options):
+        rng = random.Random(options['seed'])
+        fake = Faker()
+        fake.seed_instance(options['seed'])
+        mixer.faker.seed_instance(options['seed'])
+        password = make_password(PASSWORD)
+
+        users = [
+            mixer.blend(User, username=f'{fake.user_name()}{i}', email=fake.email(), password=password, is_active=True)
+            for i in range(options['users'])
+        ]
+        for user in users:
+            mixer.blend(Wallet, user=user, balance=10 ** 9)
+
+        words = []
+        apps = []
+        for _ in range(options['apps']):
+            title = fake.catch_phrase()
+            words.append(title.split()[0].lower())
+            apps.append(mixer.blend(
+                App,
+                user=rng.choice(users),
+                title=title,
+                description=fake.paragraph(),
+                access_link=fake.url(),
+                icon=None,
+                price=rng.randint(0, 50),
+                verified=rng.random() < 0.8,
+            ))
+
+        for _ in range(options['purchases']):
+            app = rng.choice(apps)
+            buyer = rng.choice([user for user in users[:10] if user.id != app.user_id])
+            mixer.blend(Purchase, app=app, issued_by=buyer, price=app.price, unit=app.unit)
+
+        return Scenario(users, apps, words, rng)
+
+    def login(self, client, scenario, user):
+        if user.id not in scenario.tokens:
+            response = client.post('/auth/login/', {'username': user.username, 'password': PASSWORD})
+            scenario.tokens[user.id] = response.json()
+        return scenario.tokens[user.id]
+
+    def request(self, name, client, scenario, user):
+        """Sends one request to ``name``, logging in first does not count towards the measurement"""
+
+        tokens = self.login(client, scenario, user)
+        headers = {'HTTP_AUTHORIZATION': f'JWT {tokens["access"]}'}
+
+        if name == 'register':
+            username = f'bench-{scenario.next_id()}'
+            return lambda: client.post('/auth/register/', {
+                'username': username, 'email': f'{username}@example.com',
+                'password': PASSWORD, 'password_confirmation': PASSWORD,
+            })
+        if name == 'login':
+            return lambda: client.post('/auth/login/', {'username': user.username, 'password': PASSWORD})
+        if name == 'refresh':
+            return lambda: client.post('/auth/token/refresh/', {'refresh': tokens['refresh']})
+        if name == 'apps':
+            return lambda: client.get('/api/apps/', **headers)
+        if name == 'verified':
+            term = scenario.choice(scenario.words)
+            return lambda: client.get('/api/apps/verified/', {'search': term}, **headers)
+        if name == 'purchase_create':
+            # an app can be bought once, every purchase gets a new one
+            app = App.objects.create(
+                user=scenario.choice([seller for seller in scenario.users if seller.id != user.id]),
+                title=f'bench-{scenario.next_id()}', description='', access_link='https://example.com',
+                price=scenario.choice(range(51)),
+            )
+            return lambda: client.post('/api/purchases/', {'app': app.id}, content_type='application/json', **headers)
+        if name == 'purchase_list':
+            return lambda: client.get('/api/purchases/', **headers)
+        if name == 'upload':
+            color = tuple(scenario.choice(range(256)) for _ in range(3))
+            buffer = BytesIO()
+            Image.new('RGB', (256, 256), color).save(buffer, 'PNG')
+            buffer.name = 'icon.png'
+            buffer.seek(0)
+            return lambda: client.post('/upload/', {'file': buffer}, **headers)
+
+    def run(self, name, scenario, total, concurrency):
+        """
+        Non-2xx responses are counted in ``statuses`` and ``errors`` only, latency and rps cover the
+        successful ones. SQLite fails a transaction which upgrades to a writer while another one writes
+        instead of waiting for the busy timeout, so on SQLite writes, the unmeasured setup included, are
+        sent one at a time and their latency leaves the wait for their turn out.
+        """
+
+        latencies, queries, statuses = [], [], Counter()
+        remaining = iter(range(total))
+        lock = threading.Lock()
+        write_lock = threading.Lock() if connection.vendor == 'sqlite' else None
+        serialized = write_lock is not None and name not in READ_ENDPOINTS
+
+        def worker():
+            client = Client(raise_request_exception=False)
+            try:
+                while True:
+                    with lock:
+                        if next(remaining, None) is None:
+                            return
+
+                    # the setup logs in and creates apps, it writes whatever the endpoint
+                    with write_lock or nullcontext():
+                        send = self.request(name, client, scenario, scenario.choice(scenario.users))
+
+                    with write_lock if serialized else nullcontext(), CaptureQueriesContext(connection) as captured:
+                        started = time.perf_counter()
+                        response = send()
+                        elapsed = time.perf_counter() - started
+
+                    with lock:
+                        statuses[str(response.status_code)] += 1
+                        if 200 <= response.status_code < 300:
+                            latencies.append(elapsed * 1000)
+                            queries.append(len(captured))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        duration = time.perf_counter() - started
+
+        return {
+            'requests': sum(statuses.values()),
+            'errors': sum(statuses.values()) - len(latencies),
+            'statuses': dict(statuses),
+            'serialized': serialized,
+            'rps': round(len(latencies) / duration, 2),
+            'latency_ms': percentiles(latencies),
+            'queries': {'mean': round(statistics.fmean(queries), 2), 'max': max(queries)} if queries else {},
+        }
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR
+            ).stdout.strip() or None
+        except OSError:
+            commit = None
+
+        return {
+            'commit': commit,
+            'database': connection.vendor,
+            **{key: options[key] for key in ('users', 'apps', 'purchases', 'requests', 'concurrency', 'seed')},
+        }
+
+
+def percentile(ordered, p):
+    # nearest rank, one of the measured values whatever the sample size
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def percentiles(latencies):
+    if not latencies:
+        return {}
+
+    ordered = sorted(latencies)
+    return {
+        'p50': round(percentile(ordered, 50), 3),
+        'p95': round(percentile(ordered, 95), 3),
+        'p99': round(percentile(ordered, 99), 3),
+        'mean': round(statistics.fmean(latencies), 3),
+    }
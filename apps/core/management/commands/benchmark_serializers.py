@@ -0,0 +1,59 @@
+import json
+import timeit
+
+from mixer.backend.django import mixer
+from django.contrib.auth.models import User
+from django.core.management import BaseCommand
+from django.db import connection
+from apps.core.models import App, Purchase
+from apps.core.serializers import AppReadSerializer, AppListSerializer, PurchaseReadSerializer, PurchaseListSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compares the list serializers with the ModelSerializers they replace on a throwaway database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100, help='rows per page, PAGE_SIZE in production')
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+        try:
+            user = mixer.blend(User)
+            apps = mixer.cycle(count=rows).blend(App, user=user)
+            for app in apps:
+                mixer.blend(Purchase, issued_by=user, app=app, price=app.price)
+
+            app_qs = App.objects.order_by('id')[:rows]
+            purchase_qs = Purchase.objects.order_by('id')[:rows]
+            cases = {
+                'apps': (
+                    lambda: AppReadSerializer(app_qs, many=True, context={'scope': 'public'}).data,
+                    lambda: AppListSerializer(AppListSerializer.prepare(app_qs), context={'scope': 'public'}).data,
+                ),
+                'purchases': (
+                    lambda: PurchaseReadSerializer(purchase_qs.select_related('app'), many=True).data,
+                    lambda: PurchaseListSerializer(PurchaseListSerializer.prepare(purchase_qs)).data,
+                ),
+            }
+            report = {name: self.compare(*case, repeat) for name, case in cases.items()}
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(json.dumps({'rows': rows, 'repeat': repeat, 'results': report}, indent=2))
+
+    def compare(self, model_serializer, list_serializer, repeat):
+        """Milliseconds per page including the query, best of three runs"""
+
+        def best(func):
+            return min(timeit.repeat(func, number=repeat, repeat=3)) / repeat * 1000
+
+        model_ms, list_ms = best(model_serializer), best(list_serializer)
+        return {
+            'model_serializer_ms': round(model_ms, 3),
+            'list_serializer_ms': round(list_ms, 3),
+            'speedup': round(model_ms / list_ms, 2),
+        }
@@ -0,0 +1,50 @@
+import os
+
+from datetime import timedelta
+from urllib.parse import urlparse
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from apps.core import icons
+from apps.core.models import App, IconBlob
+
+
+class Command(BaseCommand):
+    help = 'Deletes icon blobs and their files once no upload or app refers to them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='seconds a blob is kept after it was stored, covers in-flight uploads'
+        )
+
+    def handle(self, *args, **options):
+        created_before = timezone.now() - timedelta(seconds=options['min_age'])
+        candidates = IconBlob.objects.filter(icons__isnull=True, created_at__lte=created_before)
+        referenced = self.referenced_files()
+        deleted = 0
+
+        for blob_id, name in candidates.values_list('id', 'file').iterator():
+            if os.path.basename(name) in referenced:
+                continue
+            if self.collect(blob_id):
+                deleted += 1
+
+        self.stdout.write(self.style.SUCCESS(f'{deleted} unreferenced icon blobs deleted'))
+
+    def referenced_files(self):
+        # blob files are named after their digest, the last segment of an icon url tells which one it shows
+        icons = App.objects.exclude(icon__isnull=True).exclude(icon='').values_list('icon', flat=True)
+        return {os.path.basename(urlparse(icon).path) for icon in icons.iterator()}
+
+    def collect(self, blob_id):
+        # icons.store() locks the blob it reuses until the upload refers to it, checked again under the lock
+        with transaction.atomic():
+            blob = IconBlob.objects.select_for_update().filter(id=blob_id).first()
+            if blob is None or blob.icons.exists():
+                return False
+
+            blob.delete()
+            # before the lock is released, a new blob of the same bytes is only written after it
+            icons.delete_files(blob)
+        return True
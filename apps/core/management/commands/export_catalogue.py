@@ -0,0 +1,31 @@
+import os
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from apps.core import transfer
+from appstore.renderers import ENCODERS
+
+
+class Command(BaseCommand):
+    help = (
+        'Writes the users, wallets and apps into a directory, one file each, for import_catalogue. '
+        'The files carry the password hashes of the users'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--format', choices=('ndjson', 'csv'), default='ndjson')
+        parser.add_argument(
+            '--chunk-size', type=int, default=settings.STREAM_CHUNK_SIZE, help='rows read per round trip'
+        )
+
+    def handle(self, *args, **options):
+        os.makedirs(options['directory'], exist_ok=True)
+        encoder_class = ENCODERS[options['format']]
+
+        for kind in transfer.KINDS:
+            path = os.path.join(options['directory'], f'{kind}.{encoder_class.extension}')
+            count = transfer.export_file(kind, path, encoder_class, options['chunk_size'])
+            self.stdout.write(f'{kind}: {count} rows written to {path}')
+
+        self.stdout.write(self.style.SUCCESS('Export done'))
@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.core.management import BaseCommand
+from apps.core import ledger
+from apps.core.models import Wallet, WalletShard
+
+
+class Command(BaseCommand):
+    help = 'Folds the sharded seller credits into Wallet.balance'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='wallets folded per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        wallet_ids = list(
+            WalletShard.objects.exclude(balance=0).order_by('wallet').values_list('wallet', flat=True).distinct()
+        )
+        folded = 0
+
+        for start in range(0, len(wallet_ids), batch_size):
+            with transaction.atomic():
+                wallets = Wallet.objects.select_for_update().filter(id__in=wallet_ids[start:start + batch_size])
+                for wallet in wallets:
+                    folded += ledger.fold(wallet)
+
+        self.stdout.write(self.style.SUCCESS(f'{len(wallet_ids)} wallets folded, {folded} credited'))
@@ -0,0 +1,32 @@
+import os
+
+from django.core.management import BaseCommand, CommandError
+from apps.core import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Loads users, wallets and apps from the users, wallets and apps .ndjson, .jsonl or .csv files of a '
+        'directory, as written by export_catalogue, with bulk inserts and one transaction per batch'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+        parser.add_argument('--batch-size', type=int, default=1000, help='rows inserted per transaction')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        found = False
+        for kind in transfer.KINDS:
+            for extension in transfer.EXTENSIONS:
+                path = os.path.join(options['directory'], f'{kind}.{extension}')
+                if os.path.exists(path):
+                    found = True
+                    read, created = transfer.import_file(kind, path, options['batch_size'])
+                    self.stdout.write(f'{kind}: {created} of {read} rows imported from {path}')
+
+        if not found:
+            raise CommandError(f'No users, wallets or apps file in {options["directory"]}')
+        self.stdout.write(self.style.SUCCESS('Import done'))
@@ -0,0 +1,24 @@
+from django.core.management import BaseCommand
+from django.utils import timezone
+from apps.core.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired Idempotency-Key records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='rows deleted per query')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = 0
+
+        while True:
+            ids = list(
+                IdempotencyKey.objects.filter(expires_at__lte=now).values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not ids:
+                break
+            deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f'{deleted} expired idempotency keys deleted'))
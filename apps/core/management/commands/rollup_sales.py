@@ -0,0 +1,38 @@
+from datetime import date, timedelta
+from django.core.management import BaseCommand, CommandError
+from django.utils import timezone
+from apps.core import sales
+from apps.core.models import Purchase
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the daily sales rollups out of the purchases, for backfills and catching up after failures'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since', type=date.fromisoformat, help='first day, YYYY-MM-DD, the day of the first purchase by default'
+        )
+        parser.add_argument('--until', type=date.fromisoformat, help='last day included, today by default')
+        parser.add_argument('--batch-days', type=int, default=7, help='days rebuilt per transaction')
+
+    def handle(self, *args, **options):
+        until = options['until'] or timezone.localdate()
+        since = options['since']
+
+        if since is None:
+            first = Purchase.objects.order_by('created_at').values_list('created_at', flat=True).first()
+            if first is None:
+                self.stdout.write('No purchases to roll up')
+                return
+            since = timezone.localdate(first)
+
+        if since > until:
+            raise CommandError('--since is after --until')
+
+        rows, day = 0, since
+        while day <= until:
+            last = min(day + timedelta(days=options['batch_days'] - 1), until)
+            rows += sales.rebuild(day, last)
+            day = last + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(f'{(until - since).days + 1} days rolled up into {rows} rows'))
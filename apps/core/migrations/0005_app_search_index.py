@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from apps.core.search import install_index, uninstall_index
+
+
+def create_search_index(apps, schema_editor):
+    install_index(schema_editor)
+
+
+def drop_search_index(apps, schema_editor):
+    uninstall_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_alter_purchase_options'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.4 on 2026-10-18 15:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_app_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.SmallIntegerField()),
+                ('balance', models.FloatField(default=0)),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shards', to='core.wallet')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('kind', models.SmallIntegerField(choices=[(1, 'Debit'), (2, 'Credit')])),
+                ('amount', models.FloatField()),
+                ('unit', models.SmallIntegerField(choices=[(1, 'USD')], default=1)),
+                ('purchase', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='entries', to='core.purchase')),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='core.wallet')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='walletshard',
+            constraint=models.UniqueConstraint(fields=('wallet', 'index'), name='unique_wallet_shard'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.4 on 2026-10-18 15:23
+
+import apps.core.models
+from django.db import migrations, models
+import django.db.models.deletion
+import functools
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IconBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('file', models.ImageField(upload_to=functools.partial(apps.core.models.blob_upload_to, *('icons',), **{}))),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=16)),
+                ('renditions', models.JSONField(blank=True, default=dict)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='uploadedicon',
+            name='blob',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='icons', to='core.iconblob'),
+        ),
+    ]
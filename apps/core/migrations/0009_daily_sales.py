@@ -0,0 +1,44 @@
+# Generated by Django 4.2.4 on 2026-10-18 15:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_iconblob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unit', models.SmallIntegerField(choices=[(1, 'USD')], default=1)),
+                ('day', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.FloatField(default=0)),
+            ],
+            options={
+                'ordering': ['day', 'unit'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['app', 'created_at'], name='purchase_app_created_at'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['created_at'], name='purchase_created_at'),
+        ),
+        migrations.AddField(
+            model_name='dailysales',
+            name='app',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='core.app'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(fields=('app', 'day', 'unit'), name='unique_app_daily_sales'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.4 on 2026-10-18 15:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_daily_sales'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='app',
+            index=models.Index(fields=['user', 'id'], name='app_user_id'),
+        ),
+        migrations.AddIndex(
+            model_name='app',
+            index=models.Index(condition=models.Q(('verified', True)), fields=['id'], name='app_verified_id'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['issued_by', 'id'], name='purchase_issued_by_id'),
+        ),
+    ]
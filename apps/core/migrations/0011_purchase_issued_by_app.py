@@ -0,0 +1,17 @@
+# Generated by Django 4.2.4 on 2026-10-18 15:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['issued_by', 'app'], name='purchase_issued_by_app'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.4 on 2026-10-18 16:01
+
+from django.db import migrations, models
+
+from apps.core.search import install_triggers
+
+
+def reinstall_search_triggers(apps, schema_editor):
+    install_triggers(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_purchase_issued_by_app'),
+    ]
+
+    # SQLite remakes core_app both ways, which drops the search triggers
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, reinstall_search_triggers),
+        migrations.AddField(
+            model_name='app',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(reinstall_search_triggers, migrations.RunPython.noop),
+    ]
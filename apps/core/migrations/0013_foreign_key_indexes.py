@@ -0,0 +1,41 @@
+# Generated by Django 4.2.4 on 2026-10-18 17:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from apps.core.search import install_triggers
+
+
+def reinstall_search_triggers(apps, schema_editor):
+    install_triggers(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0012_app_updated_at'),
+    ]
+
+    # the composite indexes lead with these foreign keys. SQLite remakes core_app both ways, which drops
+    # the search triggers
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, reinstall_search_triggers),
+        migrations.AlterField(
+            model_name='app',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='apps', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='purchase',
+            name='app',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='purchases', to='core.app'),
+        ),
+        migrations.AlterField(
+            model_name='purchase',
+            name='issued_by',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='purchases', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(reinstall_search_triggers, migrations.RunPython.noop),
+    ]
@@ -4,8 +4,9 @@ import hashlib
 from functools import partial
 from uuid import uuid4
 from django.db import models
+from django.db.models import Sum
 from django.contrib.auth.models import User
-from apps.core.constants import WALLET_UNITS, USD
+from apps.core.constants import WALLET_UNITS, USD, LEDGER_ENTRY_KINDS, ICON_STATUSES, ICON_PENDING, ICON_READY
 
 
 def upload_to(prefix, _, filename):
@@ -13,6 +14,11 @@ def upload_to(prefix, _, filename):
     return f'{prefix}/{hashlib.sha1(name.encode()).hexdigest()}{ext}'
 
 
+def blob_upload_to(prefix, instance, filename):
+    _, ext = os.path.splitext(filename)
+    return f'{prefix}/{instance.digest[:2]}/{instance.digest}{ext.lower()}'
+
+
 class WithDateTime(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -30,23 +36,58 @@ class App(WithDateTime):
     price = models.FloatField(default=0)
     unit = models.SmallIntegerField(choices=WALLET_UNITS, default=USD)
 
-    user = models.ForeignKey(User, related_name='apps', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name='apps', on_delete=models.CASCADE, db_index=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     class Meta:
         ordering = ['id']
+        # they lead with the foreign keys, which have no index of their own
+        indexes = [
+            models.Index(fields=['user', 'id'], name='app_user_id'),
+            models.Index(fields=['id'], condition=models.Q(verified=True), name='app_verified_id'),
+        ]
 
 
 class Purchase(WithDateTime):
-    app = models.ForeignKey(App, related_name='purchases', on_delete=models.SET_NULL, null=True)
-    issued_by = models.ForeignKey(User, related_name='purchases', on_delete=models.SET_NULL, null=True)
+    app = models.ForeignKey(App, related_name='purchases', on_delete=models.SET_NULL, null=True, db_index=False)
+    issued_by = models.ForeignKey(User, related_name='purchases', on_delete=models.SET_NULL, null=True, db_index=False)
     price = models.FloatField()
     unit = models.SmallIntegerField(choices=WALLET_UNITS, default=USD)
 
     class Meta:
         ordering = ['id']
+        # they lead with the foreign keys, which have no index of their own
+        indexes = [
+            models.Index(fields=['issued_by', 'id'], name='purchase_issued_by_id'),
+            models.Index(fields=['issued_by', 'app'], name='purchase_issued_by_app'),
+            models.Index(fields=['app', 'created_at'], name='purchase_app_created_at'),
+            models.Index(fields=['created_at'], name='purchase_created_at'),
+        ]
+
+
+class DailySales(models.Model):
+    """Purchases of an app rolled up per day and unit, see apps.core.sales"""
+
+    app = models.ForeignKey(App, related_name='daily_sales', on_delete=models.CASCADE)
+    unit = models.SmallIntegerField(choices=WALLET_UNITS, default=USD)
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+    revenue = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ['day', 'unit']
+        constraints = [
+            models.UniqueConstraint(fields=['app', 'day', 'unit'], name='unique_app_daily_sales'),
+        ]
 
 
 class Wallet(WithDateTime):
@@ -57,7 +98,74 @@ class Wallet(WithDateTime):
     def __str__(self):
         return self.user.username or self.user.email or f'user #{self.user.id}'
 
+    @property
+    def total_balance(self):
+        return self.balance + (self.shards.aggregate(total=Sum('balance'))['total'] or 0)
+
+
+class WalletShard(models.Model):
+    """Seller credits are spread over a few rows per wallet so concurrent sales don't queue on one lock"""
+
+    wallet = models.ForeignKey(Wallet, related_name='shards', on_delete=models.CASCADE)
+    index = models.SmallIntegerField()
+    balance = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['wallet', 'index'], name='unique_wallet_shard'),
+        ]
+
+
+class LedgerEntry(WithDateTime):
+    wallet = models.ForeignKey(Wallet, related_name='entries', on_delete=models.CASCADE)
+    purchase = models.ForeignKey(Purchase, related_name='entries', on_delete=models.SET_NULL, null=True)
+    kind = models.SmallIntegerField(choices=LEDGER_ENTRY_KINDS)
+    amount = models.FloatField()
+    unit = models.SmallIntegerField(choices=WALLET_UNITS, default=USD)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Ledger entries are append-only')
+        super().save(*args, **kwargs)
+
+    class Meta:
+        ordering = ['id']
+
+
+class IdempotencyKey(WithDateTime):
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.SmallIntegerField(null=True)
+    response = models.JSONField(null=True)
+    expires_at = models.DateTimeField(db_index=True)
+    user = models.ForeignKey(User, related_name='idempotency_keys', on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_user_idempotency_key'),
+        ]
+
+
+class IconBlob(WithDateTime):
+    """Icon content stored once per sha256 digest, shared by every upload of the same bytes"""
+
+    digest = models.CharField(max_length=64, unique=True)
+    file = models.ImageField(upload_to=partial(blob_upload_to, 'icons'))
+    size = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=16, choices=ICON_STATUSES, default=ICON_PENDING)
+    renditions = models.JSONField(default=dict, blank=True)
+
 
 class UploadedIcon(WithDateTime):
     file = models.ImageField(upload_to=partial(upload_to, 'icons'))
+    blob = models.ForeignKey(IconBlob, related_name='icons', on_delete=models.PROTECT, null=True)
     user = models.ForeignKey(User, related_name='icons', on_delete=models.CASCADE)
+
+    @property
+    def status(self):
+        # icons uploaded before content addressing have no blob and were stored as they came
+        return self.blob.status if self.blob else ICON_READY
+
+    @property
+    def renditions(self):
+        return self.blob.renditions if self.blob else {}
@@ -0,0 +1,69 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from apps.core.models import Purchase, DailySales
+
+
+def rollup(purchases):
+    totals = defaultdict(lambda: [0, 0.0])
+
+    for purchase in purchases:
+        if purchase.app_id is None:
+            continue
+        total = totals[purchase.app_id, timezone.localdate(purchase.created_at), purchase.unit]
+        total[0] += 1
+        total[1] += purchase.price
+
+    return totals
+
+
+def record(purchases):
+    """Adds committed purchases to the rollups, meant to run from transaction.on_commit"""
+
+    for (app_id, day, unit), (count, revenue) in rollup(purchases).items():
+        row = DailySales.objects.filter(app=app_id, day=day, unit=unit)
+        increment = {'count': F('count') + count, 'revenue': F('revenue') + revenue}
+
+        if not row.update(**increment):
+            DailySales.objects.get_or_create(app_id=app_id, day=day, unit=unit)
+            row.update(**increment)
+
+
+def record_on_commit(purchases):
+    purchases = list(purchases)
+    # the purchases are charged by then, a failing rollup is logged and left to the rollup_sales command
+    transaction.on_commit(lambda: record(purchases), robust=True)
+
+
+def day_bounds(since, until):
+    tz = timezone.get_current_timezone()
+    return (
+        datetime.combine(since, time.min, tzinfo=tz),
+        datetime.combine(until + timedelta(days=1), time.min, tzinfo=tz),
+    )
+
+
+def rebuild(since, until):
+    """Recomputes the rollups of the days from ``since`` to ``until`` included out of the purchases"""
+
+    start, end = day_bounds(since, until)
+    rows = (
+        Purchase.objects
+        .filter(created_at__gte=start, created_at__lt=end, app__isnull=False)
+        .annotate(day=TruncDate('created_at'))
+        .values('app', 'day', 'unit')
+        .annotate(count=Count('id'), revenue=Sum('price'))
+        .order_by()
+    )
+
+    with transaction.atomic():
+        DailySales.objects.filter(day__gte=since, day__lte=until).delete()
+        created = DailySales.objects.bulk_create(
+            DailySales(app_id=row['app'], day=row['day'], unit=row['unit'], count=row['count'], revenue=row['revenue'])
+            for row in rows.iterator()
+        )
+
+    return len(created)
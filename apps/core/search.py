@@ -0,0 +1,155 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+
+TOKEN_SEPARATOR = re.compile(r'[-_]+')
+
+
+def tokenize(term):
+    return [token for token in TOKEN_SEPARATOR.split(term) if token]
+
+
+class PostgresSearchBackend:
+    """Ranks with ts_rank over the generated, GIN indexed ``search_vector`` column"""
+
+    config = 'english'
+
+    def search(self, qs, term):
+        table = qs.model._meta.db_table
+        query = ' & '.join(f'{token}:*' for token in tokenize(term))
+        ts_query = 'to_tsquery(%s::regconfig, %s)'
+
+        return qs.filter(
+            RawSQL(f'"{table}"."search_vector" @@ {ts_query}', (self.config, query), output_field=BooleanField())
+        ).annotate(
+            rank=RawSQL(
+                f'ts_rank("{table}"."search_vector", {ts_query})', (self.config, query), output_field=FloatField()
+            )
+        ).order_by('-rank', 'id')
+
+
+class SQLiteSearchBackend:
+    """Ranks with bm25 over the trigger maintained FTS5 ``<table>_fts`` table"""
+
+    title_weight = 10.0
+    description_weight = 1.0
+
+    def search(self, qs, term):
+        table = qs.model._meta.db_table
+        fts = f'{table}_fts'
+        query = ' '.join(f'"{token}"*' for token in tokenize(term))
+
+        return qs.filter(
+            RawSQL(
+                f'"{table}"."id" IN (SELECT rowid FROM {fts} WHERE {fts} MATCH %s)', (query,),
+                output_field=BooleanField()
+            )
+        ).annotate(
+            rank=RawSQL(
+                f'SELECT -bm25({fts}, %s, %s) FROM {fts} WHERE {fts} MATCH %s AND rowid = "{table}"."id"',
+                (self.title_weight, self.description_weight, query),
+                output_field=FloatField()
+            )
+        ).order_by('-rank', 'id')
+
+
+class IContainsSearchBackend:
+    """Fallback for databases without a maintained index, scans every row"""
+
+    def search(self, qs, term):
+        return qs.filter(Q(title__icontains=term) | Q(description__icontains=term))
+
+
+SEARCH_BACKENDS = {
+    'postgresql': PostgresSearchBackend(),
+    'sqlite': SQLiteSearchBackend(),
+}
+
+
+def search_apps(qs, term):
+    # separators only, such as '-', pass validate_slug but leave nothing to match
+    if not tokenize(term):
+        return qs
+
+    backend = SEARCH_BACKENDS.get(connections[qs.db].vendor, IContainsSearchBackend())
+    return backend.search(qs, term)
+
+
+INDEX_SQL = {
+    'postgresql': (
+        """
+        ALTER TABLE core_app ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(description, '')), 'B')
+        ) STORED
+        """,
+        'CREATE INDEX core_app_search_vector_idx ON core_app USING gin (search_vector) WHERE verified',
+    ),
+    'sqlite': (
+        """
+        CREATE VIRTUAL TABLE core_app_fts USING fts5(
+            title, description, content='core_app', content_rowid='id'
+        )
+        """,
+        'INSERT INTO core_app_fts(rowid, title, description) '
+        'SELECT id, title, description FROM core_app WHERE verified',
+    ),
+}
+
+# Only verified apps are indexed. The triggers are dropped whenever SQLite rebuilds core_app,
+# so migrations which remake the table have to call install_triggers() again.
+TRIGGERS_SQL = {
+    'sqlite': (
+        """
+        CREATE TRIGGER core_app_fts_insert AFTER INSERT ON core_app WHEN new.verified BEGIN
+            INSERT INTO core_app_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+        END
+        """,
+        """
+        CREATE TRIGGER core_app_fts_delete AFTER DELETE ON core_app WHEN old.verified BEGIN
+            INSERT INTO core_app_fts(core_app_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END
+        """,
+        """
+        CREATE TRIGGER core_app_fts_update AFTER UPDATE OF title, description, verified ON core_app BEGIN
+            INSERT INTO core_app_fts(core_app_fts, rowid, title, description)
+            SELECT 'delete', old.id, old.title, old.description WHERE old.verified;
+            INSERT INTO core_app_fts(rowid, title, description)
+            SELECT new.id, new.title, new.description WHERE new.verified;
+        END
+        """,
+    ),
+}
+
+DROP_SQL = {
+    'postgresql': (
+        'DROP INDEX IF EXISTS core_app_search_vector_idx',
+        'ALTER TABLE core_app DROP COLUMN IF EXISTS search_vector',
+    ),
+    'sqlite': (
+        'DROP TRIGGER IF EXISTS core_app_fts_insert',
+        'DROP TRIGGER IF EXISTS core_app_fts_delete',
+        'DROP TRIGGER IF EXISTS core_app_fts_update',
+        'DROP TABLE IF EXISTS core_app_fts',
+    ),
+}
+
+
+def install_triggers(schema_editor):
+    for statement in TRIGGERS_SQL.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(statement)
+
+
+def install_index(schema_editor):
+    for statement in INDEX_SQL.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(statement)
+    install_triggers(schema_editor)
+
+
+def uninstall_index(schema_editor):
+    for statement in DROP_SQL.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(statement)
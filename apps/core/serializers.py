@@ -1,8 +1,12 @@
+from datetime import timedelta
+from django.core.validators import validate_image_file_extension
 from django.db import transaction
-from django.db.models import F
+from django.utils import timezone
 from rest_framework import serializers
-from apps.core.models import App, Purchase, UploadedIcon, Wallet
-from apps.core.exceptions import InsufficientFundException, SelfPurchaseException
+from rest_framework.exceptions import NotFound
+from apps.core import entitlements, ledger, sales
+from apps.core.models import App, Purchase, UploadedIcon, DailySales
+from apps.core.exceptions import InsufficientFundException, SelfPurchaseException, DuplicatePurchaseException
 
 
 class AppCreateSerializer(serializers.ModelSerializer):
@@ -56,6 +60,80 @@ class PurchaseReadSerializer(serializers.ModelSerializer):
         fields = ('id', 'app', 'price', 'unit', 'created_at')
 
 
+def timestamp(value):
+    return int(value.timestamp() * 1000)
+
+
+class ListOnlySerializer(serializers.BaseSerializer):
+    """
+    Read only serializer converting a whole page of ``values_list(named=True)`` rows at once.
+    Querysets have to go through prepare() before they are paginated.
+    """
+
+    columns = ()
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        return cls(*args, **kwargs)
+
+    @classmethod
+    def prepare(cls, qs):
+        return qs.values_list(*cls.columns, named=True)
+
+
+class AppListSerializer(ListOnlySerializer):
+    """Same payload as AppReadSerializer(many=True)"""
+
+    columns = ('id', 'title', 'description', 'access_link', 'access_key', 'price', 'created_at', 'icon')
+
+    def to_representation(self, rows):
+        public = self.context.get('scope') == 'public'
+
+        return [
+            {
+                'id': row.id,
+                'title': row.title,
+                'description': row.description,
+                'access_link': None if public else row.access_link,
+                'access_key': None if public else row.access_key,
+                'price': row.price,
+                'created_at': timestamp(row.created_at),
+                'icon': row.icon or None,
+            }
+            for row in rows
+        ]
+
+
+class PurchaseListSerializer(ListOnlySerializer):
+    """Same payload as PurchaseReadSerializer(many=True), the app is read through the join"""
+
+    columns = (
+        'id', 'price', 'unit', 'created_at', 'app__id', 'app__title', 'app__description', 'app__access_link',
+        'app__access_key', 'app__price', 'app__created_at', 'app__icon',
+    )
+
+    def to_representation(self, rows):
+        return [
+            {
+                'id': row.id,
+                'app': {
+                    'id': row.app__id,
+                    'title': row.app__title,
+                    'description': row.app__description,
+                    'access_link': row.app__access_link,
+                    'access_key': row.app__access_key,
+                    'price': row.app__price,
+                    'created_at': timestamp(row.app__created_at),
+                    'icon': row.app__icon or None,
+                } if row.app__id is not None else None,
+                'price': row.price,
+                'unit': row.unit,
+                'created_at': timestamp(row.created_at),
+            }
+            for row in rows
+        ]
+
+
 class PurchaseWriteSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         app = validated_data['app']
@@ -65,22 +143,21 @@ class PurchaseWriteSerializer(serializers.ModelSerializer):
             raise SelfPurchaseException()
 
         with transaction.atomic():
-            issuer_wallet = Wallet.objects.select_for_update().filter(
-                user=issuer_by.id,
-                balance__gte=app.price,
-            ).first()
+            issuer_wallet = ledger.lock_wallet(issuer_by.id)
 
-            if issuer_wallet:
+            # purchases of a buyer are serialized by the wallet lock, only the database decides a duplicate
+            if entitlements.owned_among(issuer_by.id, [app.id]):
+                raise DuplicatePurchaseException()
+            if ledger.reserve(issuer_wallet, app.price):
                 obj = Purchase.objects.create(
                     **validated_data,
                     price=app.price,
                     unit=app.unit
                 )
 
-                issuer_wallet.balance -= app.price
-                issuer_wallet.save()
-
-                Wallet.objects.filter(user=app.user.id).update(balance=F('balance') + app.price)
+                ledger.settle(issuer_wallet, [obj])
+                sales.record_on_commit([obj])
+                entitlements.invalidate_on_commit(issuer_by.id)
             else:
                 raise InsufficientFundException()
 
@@ -91,10 +168,107 @@ class PurchaseWriteSerializer(serializers.ModelSerializer):
         fields = ('app', 'issued_by')
 
 
+class BulkPurchaseSerializer(serializers.Serializer):
+    """Buys every listed app with one wallet lock, expects the id of the buyer as ``issued_by_id`` in the context"""
+
+    apps = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=100)
+
+    def create(self, validated_data):
+        issued_by_id = self.context['issued_by_id']
+        app_ids = list(dict.fromkeys(validated_data['apps']))
+        apps = App.objects.in_bulk(app_ids)
+        failures, purchases, spent = {}, [], 0
+
+        with transaction.atomic():
+            issuer_wallet = ledger.lock_wallet(issued_by_id)
+            owned = entitlements.owned_among(issued_by_id, list(apps))
+
+            for app_id in app_ids:
+                app = apps.get(app_id)
+
+                if app is None:
+                    failures[app_id] = NotFound()
+                elif app.user_id == issued_by_id:
+                    failures[app_id] = SelfPurchaseException()
+                elif app_id in owned:
+                    failures[app_id] = DuplicatePurchaseException()
+                elif not ledger.reserve(issuer_wallet, spent + app.price):
+                    failures[app_id] = InsufficientFundException()
+                else:
+                    spent += app.price
+                    purchases.append(Purchase(app=app, issued_by_id=issued_by_id, price=app.price, unit=app.unit))
+
+            if purchases:
+                Purchase.objects.bulk_create(purchases)
+                ledger.settle(issuer_wallet, purchases)
+                sales.record_on_commit(purchases)
+                entitlements.invalidate_on_commit(issued_by_id)
+
+        return [
+            {
+                'id': app_id,
+                'status_code': failures[app_id].status_code,
+                'detail': str(failures[app_id].detail),
+                'app': None,
+            } if app_id in failures else {
+                'id': app_id,
+                'status_code': 200,
+                'detail': None,
+                'app': AppReadSerializer(apps[app_id]).data,
+            }
+            for app_id in app_ids
+        ]
+
+
+class EntitlementCheckSerializer(serializers.Serializer):
+    apps = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=1000)
+
+
+class AccessVerifySerializer(serializers.Serializer):
+    access_key = serializers.CharField(max_length=128)
+
+
+class SalesQuerySerializer(serializers.Serializer):
+    MAX_DAYS = 366
+
+    since = serializers.DateField(required=False, help_text='First day, 30 days before `until` by default')
+    until = serializers.DateField(required=False, help_text='Last day included, today by default')
+
+    def validate(self, attrs):
+        attrs.setdefault('until', timezone.localdate())
+        attrs.setdefault('since', attrs['until'] - timedelta(days=29))
+
+        if attrs['since'] > attrs['until']:
+            raise serializers.ValidationError({'since': 'Must not be after until.'})
+        if (attrs['until'] - attrs['since']).days >= self.MAX_DAYS:
+            raise serializers.ValidationError({'since': f'At most {self.MAX_DAYS} days can be requested.'})
+        return attrs
+
+
+class DailySalesSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailySales
+        fields = ('day', 'unit', 'count', 'revenue')
+
+
 class UploadedIconSerializer(serializers.ModelSerializer):
+    # decoding is left to the icon workers, only the extension is checked while uploading
+    file = serializers.FileField(validators=[validate_image_file_extension])
+    status = serializers.CharField(read_only=True)
+    renditions = serializers.SerializerMethodField()
+
+    def get_renditions(self, obj):
+        request = self.context.get('request')
+        if request is None:
+            return obj.renditions
+        return {
+            size: {image_format: request.build_absolute_uri(url) for image_format, url in formats.items()}
+            for size, formats in obj.renditions.items()
+        }
+
     class Meta:
         model = UploadedIcon
-        fields = ('file', 'user')
+        fields = ('id', 'file', 'status', 'renditions', 'user')
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
@@ -106,9 +280,13 @@ class UploadedIconSerializer(serializers.ModelSerializer):
 class PaginatedSerializer(serializers.Serializer):
     """Swagger specific serializer"""
 
-    count = serializers.IntegerField(required=False)
-    next = serializers.URLField(allow_null=True, required=False)
-    previous = serializers.URLField(allow_null=True, required=False)
+    count = serializers.IntegerField(required=False, help_text='Total number of items, omitted in cursor mode')
+    next = serializers.URLField(
+        allow_null=True, required=False, help_text='Next page link, carries an opaque `cursor` in cursor mode'
+    )
+    previous = serializers.URLField(
+        allow_null=True, required=False, help_text='Previous page link, carries an opaque `cursor` in cursor mode'
+    )
 
 
 class AppPaginationSerializer(PaginatedSerializer):
@@ -127,3 +305,42 @@ class PurchasePaginationSerializer(PaginatedSerializer):
     """Swagger specific serializer"""
 
     results = PurchaseReadSerializer(many=True, required=False)
+
+
+class BulkPurchaseResultSerializer(serializers.Serializer):
+    """Swagger specific serializer"""
+
+    id = serializers.IntegerField()
+    status_code = serializers.IntegerField()
+    detail = serializers.CharField(allow_null=True)
+    app = AppReadSerializer(allow_null=True)
+
+
+class AppSalesSerializer(serializers.Serializer):
+    """Swagger specific serializer"""
+
+    since = serializers.DateField()
+    until = serializers.DateField()
+    count = serializers.IntegerField()
+    revenue = serializers.FloatField()
+    days = DailySalesSerializer(many=True, help_text='Days without sales are omitted')
+
+
+class EntitlementsSerializer(serializers.Serializer):
+    """Swagger specific serializer"""
+
+    apps = serializers.ListField(child=serializers.IntegerField(), help_text='Ids of the owned apps')
+
+
+class EntitlementCheckResultSerializer(serializers.Serializer):
+    """Swagger specific serializer"""
+
+    owned = serializers.ListField(child=serializers.IntegerField())
+    not_owned = serializers.ListField(child=serializers.IntegerField())
+
+
+class AccessVerifyResultSerializer(serializers.Serializer):
+    """Swagger specific serializer"""
+
+    allowed = serializers.BooleanField(help_text='Whether the user owns or bought the app')
+    app = serializers.IntegerField(allow_null=True, help_text='Id of the app, null unless allowed')
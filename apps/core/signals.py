@@ -0,0 +1,41 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from apps.core import catalogue
+from apps.core.access import access_index
+from apps.core.models import App
+
+
+@receiver(post_save, sender=App)
+def invalidate_catalogue_on_save(sender, instance, created, **kwargs):
+    loaded = getattr(instance, '_loaded_values', None)
+
+    if created or loaded is None:
+        changed = instance.verified
+    else:
+        changed = (instance.verified or loaded.get('verified')) and any(
+            loaded[field] != getattr(instance, field) for field in catalogue.CATALOGUE_FIELDS if field in loaded
+        )
+
+    if changed:
+        catalogue.invalidate()
+
+    instance._loaded_values = {field: getattr(instance, field) for field in catalogue.CATALOGUE_FIELDS}
+
+
+@receiver(post_delete, sender=App)
+def invalidate_catalogue_on_delete(sender, instance, **kwargs):
+    if instance.verified:
+        catalogue.invalidate()
+
+
+@receiver(post_save, sender=App)
+def add_to_access_index(sender, instance, **kwargs):
+    app_id, access_key, owner_id = instance.id, instance.access_key, instance.user_id
+    transaction.on_commit(lambda: access_index.add(app_id, access_key, owner_id))
+
+
+@receiver(post_delete, sender=App)
+def remove_from_access_index(sender, instance, **kwargs):
+    app_id = instance.id
+    transaction.on_commit(lambda: access_index.remove(app_id))
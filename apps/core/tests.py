@@ -1,13 +1,49 @@
+import csv
+import json
+import os
+import re
+import tempfile
+import threading
+
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
+from uuid import UUID
+from contextlib import nullcontext
+
+from io import BytesIO, StringIO
+from PIL import Image
+from psycopg2 import extensions
+from urllib.parse import urlparse, parse_qs
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
-from django.test import RequestFactory, override_settings
-from django.core.exceptions import ObjectDoesNotExist
+from asgiref.sync import sync_to_async
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed, ObjectDoesNotExist
 from django.conf import settings
+from django.http import HttpResponse
+from django.db import connection
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from mixer.backend.django import mixer
-from apps.core.models import App, Purchase, Wallet
-from apps.core.views import AppViewsets, VerifiedAppsView, PurchaseViewsets
-from apps.core.serializers import AppCreateSerializer
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from apps.core.constants import DEBIT, CREDIT
+from apps.core.management.commands.collect_icon_blobs import Command as CollectIconBlobs
+from apps.core.models import App, Purchase, Wallet, WalletShard, LedgerEntry, UploadedIcon, IconBlob, DailySales
+from apps.core.views import AppViewsets, VerifiedAppsView, PurchaseViewsets, Upload, UploadDetail, \
+    AsyncAppViewsets, AsyncVerifiedAppsView, AsyncPurchaseViewsets, EntitlementViewsets, AccessVerifyView
+from apps.core.serializers import AppCreateSerializer, AppReadSerializer, AppListSerializer, \
+    PurchaseReadSerializer, PurchaseListSerializer
+from apps.core import access, catalogue, entitlements
 from apps.authenticate.tests import WithAuthTestCase
+from appstore import profiling, routers
+from appstore.routers import ReplicaRoutingMiddleware
+from appstore.db.pool import ConnectionPool, PoolTimeout
+from appstore.db.postgresql_pool.base import is_usable
+from appstore.renderers import FastJSONRenderer
+from appstore.throttling import TokenBucketStore
 
 
 class TestAppViewset(WithAuthTestCase):
@@ -44,6 +80,61 @@ class TestAppViewset(WithAuthTestCase):
         self.assertTrue(response.data['next'] is not None)
         self.assertTrue(response.data['previous'] is None)
 
+    @override_settings(STREAM_CHUNK_SIZE=3)
+    def test_applist_stream(self):
+        view = AppViewsets.as_view({'get': 'list'})
+
+        response = view(self.requester.get('apps/', {'pagination': 'stream'}))
+        self.assertEqual(b''.join(response.streaming_content), b'[]')
+
+        apps = mixer.cycle(count=7).blend(App, user=self.user)
+        response = view(self.requester.get('apps/', {'pagination': 'stream'}))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(
+            b''.join(response.streaming_content), JSONRenderer().render(AppReadSerializer(apps, many=True).data)
+        )
+
+    @override_settings(PAGE_SIZE=PAGE_SIZE)
+    def test_applist_cursor(self):
+        object_count = 7
+        apps = mixer.cycle(count=object_count).blend(App, user=self.user)
+        view = AppViewsets.as_view({'get': 'list'})
+
+        response = view(self.requester.get('apps/', {'pagination': 'cursor'}))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        self.assertTrue(response.data['previous'] is None)
+        self.assertEqual([app['id'] for app in response.data['results']], [app.id for app in apps[:self.PAGE_SIZE]])
+
+        query = parse_qs(urlparse(response.data['next']).query)
+        response = view(self.requester.get('apps/', {key: value[0] for key, value in query.items()}))
+
+        self.assertEqual([app['id'] for app in response.data['results']], [app.id for app in apps[self.PAGE_SIZE:]])
+        self.assertTrue(response.data['next'] is None)
+        self.assertTrue(response.data['previous'] is not None)
+
+    def test_export_apps(self):
+        apps = mixer.cycle(count=3).blend(App, user=self.user)
+        mixer.blend(App)
+        view = AppViewsets.as_view({'get': 'export'})
+
+        response = view(self.requester.get('apps/export/'))
+        lines = b''.join(response.streaming_content).splitlines()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="apps.ndjson"')
+        self.assertEqual(
+            [json.loads(line) for line in lines],
+            json.loads(JSONRenderer().render(AppReadSerializer(apps, many=True).data))
+        )
+
+        response = view(self.requester.get('apps/export/', {'output': 'xml'}))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_create_app(self):
         with mixer.ctx(commit=False) as mx:
             app = mx.blend(App, user=self.user, price=20)
@@ -75,6 +166,7 @@ class TestAppViewset(WithAuthTestCase):
 
 class TestVerifiedApps(WithAuthTestCase):
     def setUp(self) -> None:
+        caches['catalogue'].clear()
         self.target_user = mixer.blend(User, active=True)
 
         with mixer.ctx(commit=False) as mx:
@@ -112,12 +204,122 @@ class TestVerifiedApps(WithAuthTestCase):
         self.assertTrue(response.data['next'] is not None)
         self.assertTrue(response.data['previous'] is None)
 
+    @override_settings(PAGE_SIZE=2)
+    def test_verified_cache_excludes_own_apps(self):
+        for i in range(4):
+            mixer.blend(App, user=self.target_user, verified=True)
+            mixer.blend(App, user=self.user, verified=True)
+
+        expected = list(App.objects.filter(verified=True).exclude(user=self.user).values_list('id', flat=True))
+        view = VerifiedAppsView.as_view()
+
+        for page in (1, 2):
+            response = view(self.requester.get('apps/verified/', {'page': page}))
+            self.assertEqual(response.data['count'], len(expected))
+            self.assertEqual([app['id'] for app in response.data['results']], expected[(page - 1) * 2:page * 2])
+            self.assertTrue(all(app['access_key'] is None for app in response.data['results']))
+
+    @override_settings(PAGE_SIZE=2)
+    def test_verified_cache_lookups(self):
+        for i in range(4):
+            mixer.blend(App, user=self.target_user, verified=True)
+            mixer.blend(App, user=self.user, verified=True)
+        expected = list(App.objects.filter(verified=True).exclude(user=self.user).values_list('id', flat=True))
+        view = VerifiedAppsView.as_view()
+
+        # one lookup per request, however many entries it reads
+        view(self.requester.get('apps/verified/'))
+        self.assertEqual((catalogue.stats()['hits'], catalogue.stats()['misses']), (0, 1))
+        view(self.requester.get('apps/verified/'))
+        self.assertEqual((catalogue.stats()['hits'], catalogue.stats()['misses']), (1, 1))
+
+        # the positions of the own apps lead straight to the blocks of the page
+        items, read = catalogue.VerifiedCatalogue(None, self.user.id), []
+        block = items.block
+        items.block = lambda number: read.append(number) or block(number)
+
+        self.assertEqual([row['id'] for row in items[2:4]], expected[2:4])
+        self.assertEqual(read, [2, 3])
+
+    def test_verified_cache_invalidation(self):
+        app = mixer.blend(App, user=self.target_user, verified=True, title='Before')
+        view = VerifiedAppsView.as_view()
+
+        view(self.requester.get('apps/verified/'))
+        misses = catalogue.stats()['misses']
+        response = view(self.requester.get('apps/verified/'))
+        self.assertEqual(catalogue.stats()['misses'], misses)
+        self.assertEqual(response.data['results'][0]['title'], 'Before')
+
+        app.access_link = 'https://example.com/other'
+        app.save()
+        view(self.requester.get('apps/verified/'))
+        self.assertEqual(catalogue.stats()['misses'], misses)
+
+        app.title = 'After'
+        app.save()
+        response = view(self.requester.get('apps/verified/'))
+        self.assertGreater(catalogue.stats()['misses'], misses)
+        self.assertEqual(response.data['results'][0]['title'], 'After')
+
+    def search(self, term):
+        request = self.requester.get('apps/verified/', {'search': term})
+        response = VerifiedAppsView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [app['title'] for app in response.data['results']]
+
+    def test_verified_search_ranking(self):
+        mixer.blend(App, user=self.target_user, verified=True, title='Notes', description='Pin radar sightings')
+        mixer.blend(App, user=self.target_user, verified=True, title='Radar', description='Weather forecasts')
+        mixer.blend(App, user=self.target_user, verified=True, title='Calculator', description='Adds numbers')
+        mixer.blend(App, user=self.target_user, title='Radar draft', description='Not verified yet')
+        mixer.blend(App, user=self.user, verified=True, title='My radar', description='Own app')
+
+        self.assertEqual(self.search('rad'), ['Radar', 'Notes'])
+        self.assertEqual(self.search('weather-forecast'), ['Radar'])
+
+    def test_verified_search_separators_only(self):
+        mixer.blend(App, user=self.target_user, verified=True, title='Radar')
+
+        for term in ('-', '_', '--'):
+            self.assertEqual(self.search(term), ['Radar'])
+
+    def test_verified_search_cursor(self):
+        mixer.blend(App, user=self.target_user, verified=True, title='Radar')
+        view = VerifiedAppsView.as_view()
+
+        response = view(self.requester.get('apps/verified/', {'search': 'radar', 'pagination': 'cursor'}))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('pagination', response.data)
+
+        response = view(self.requester.get('apps/verified/', {'search': 'radar', 'pagination': 'stream'}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_verified_search_index_updates(self):
+        app = mixer.blend(App, user=self.target_user, title='Compass', description='Points north')
+        self.assertEqual(self.search('compass'), [])
+
+        app.verified = True
+        app.save()
+        self.assertEqual(self.search('compass'), ['Compass'])
+
+        app.title = 'Sextant'
+        app.save()
+        self.assertEqual(self.search('compass'), [])
+        self.assertEqual(self.search('sextant'), ['Sextant'])
+
+        app.delete()
+        self.assertEqual(self.search('sextant'), [])
+
 
 class TestPurchaseViewset(WithAuthTestCase):
     PAGE_SIZE = 5
     INIT_BALANCE = 100
 
     def setUp(self) -> None:
+        entitlements.get_cache().clear()
+        access.access_index.reset()
+
         with mixer.ctx(commit=False) as mx:
             user_a = mx.blend(User, active=True)
             user_b = mx.blend(User, active=True)
@@ -187,6 +389,302 @@ class TestPurchaseViewset(WithAuthTestCase):
         self.assertTrue(response.data['access_link'] is not None)
         self.assertEqual(response.data['id'], app.id)
 
+    def test_purchase_ledger(self):
+        app_price = 20
+        app = mixer.blend(App, user=self.user_a, price=app_price)
+        request = self.requester_b.post('purchases/', data={'app': app.id}, content_type='application/json')
+        PurchaseViewsets.as_view({'post': 'create'})(request)
+
+        seller_wallet = Wallet.objects.get(user=self.user_a)
+        buyer_wallet = Wallet.objects.get(user=self.user_b)
+        purchase = Purchase.objects.get(app=app)
+
+        self.assertEqual(
+            list(purchase.entries.values_list('wallet', 'kind', 'amount')),
+            [(buyer_wallet.id, DEBIT, app_price), (seller_wallet.id, CREDIT, app_price)]
+        )
+        self.assertEqual(buyer_wallet.balance, self.INIT_BALANCE - app_price)
+        self.assertEqual(seller_wallet.balance, self.INIT_BALANCE)
+        self.assertEqual(seller_wallet.total_balance, self.INIT_BALANCE + app_price)
+
+        with self.assertRaises(ValueError):
+            LedgerEntry.objects.first().save()
+
+        call_command('fold_wallets', stdout=StringIO())
+        seller_wallet.refresh_from_db()
+        self.assertEqual(seller_wallet.balance, self.INIT_BALANCE + app_price)
+        self.assertEqual(seller_wallet.total_balance, self.INIT_BALANCE + app_price)
+
+    def test_purchase_spends_sharded_credits(self):
+        sold = mixer.blend(App, user=self.user_b, price=30)
+        bought = mixer.blend(App, user=self.user_a, price=self.INIT_BALANCE + 10)
+        view = PurchaseViewsets.as_view({'post': 'create'})
+
+        response = view(self.requester_b.post('purchases/', data={'app': bought.id}, content_type='application/json'))
+        self.assertEqual(response.status_code, status.HTTP_402_PAYMENT_REQUIRED)
+
+        view(self.requester_a.post('purchases/', data={'app': sold.id}, content_type='application/json'))
+        response = view(self.requester_b.post('purchases/', data={'app': bought.id}, content_type='application/json'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Wallet.objects.get(user=self.user_b).total_balance, 20)
+
+    def test_bulk_purchase(self):
+        cheap, pricey = mixer.cycle(count=2).blend(App, user=self.user_a, price=(price for price in (60, 50)))
+        own = mixer.blend(App, user=self.user_b, price=10)
+        missing = own.id + 1
+
+        request = self.requester_b.post(
+            'purchases/bulk/',
+            data={'apps': [cheap.id, own.id, missing, pricey.id, cheap.id]},
+            content_type='application/json'
+        )
+        response = PurchaseViewsets.as_view({'post': 'bulk'})(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(result['id'], result['status_code']) for result in response.data],
+            [
+                (cheap.id, status.HTTP_200_OK),
+                (own.id, status.HTTP_400_BAD_REQUEST),
+                (missing, status.HTTP_404_NOT_FOUND),
+                (pricey.id, status.HTTP_402_PAYMENT_REQUIRED),
+            ]
+        )
+        self.assertEqual(response.data[0]['app']['access_key'], str(cheap.access_key))
+        self.assertEqual(list(Purchase.objects.filter(issued_by=self.user_b).values_list('app', flat=True)), [cheap.id])
+        self.assertEqual(Wallet.objects.get(user=self.user_b).total_balance, self.INIT_BALANCE - 60)
+        self.assertEqual(Wallet.objects.get(user=self.user_a).total_balance, self.INIT_BALANCE + 60)
+
+    def test_idempotent_purchase(self):
+        app = mixer.blend(App, user=self.user_a, price=20)
+        view = PurchaseViewsets.as_view({'post': 'create'})
+
+        def purchase(app_id):
+            return view(self.requester_b.post(
+                'purchases/', data={'app': app_id}, content_type='application/json', HTTP_IDEMPOTENCY_KEY='retry-1'
+            ))
+
+        first, retry = purchase(app.id), purchase(app.id)
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry.status_code, status.HTTP_200_OK)
+        self.assertEqual(retry['Idempotency-Replayed'], 'true')
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(Purchase.objects.filter(issued_by=self.user_b).count(), 1)
+        self.assertEqual(Wallet.objects.get(user=self.user_b).total_balance, self.INIT_BALANCE - 20)
+
+        other = mixer.blend(App, user=self.user_a, price=20)
+        self.assertEqual(purchase(other.id).status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_export_purchases(self):
+        app = mixer.blend(App, user=self.user_a, title='Notes, "plus"')
+        old = mixer.blend(Purchase, issued_by=self.user_b, app=app, price=app.price)
+        new = mixer.blend(Purchase, issued_by=self.user_b, app=app, price=app.price)
+        Purchase.objects.filter(pk=old.pk).update(created_at=datetime(2023, 1, 1, tzinfo=timezone.utc))
+        mixer.blend(Purchase, issued_by=self.user_b, app=mixer.blend(App, user=self.user_a)).app.delete()
+        view = PurchaseViewsets.as_view({'get': 'export'})
+
+        response = view(self.requester_b.get('purchases/export/', {'output': 'csv'}))
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="purchases.csv"')
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['app.title'], 'Notes, "plus"')
+        self.assertEqual(rows[0]['id'], str(old.id))
+        self.assertEqual(rows[2]['app.id'], '')
+
+        response = view(self.requester_b.get('purchases/export/', {'created_after': '2023-06-01T00:00:00Z'}))
+        ids = [json.loads(line)['id'] for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(ids[0], new.id)
+        self.assertNotIn(old.id, ids)
+
+        response = view(self.requester_b.get('purchases/export/', {'created_before': '2023-06-01T00:00:00Z'}))
+        ids = [json.loads(line)['id'] for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(ids, [old.id])
+
+        response = view(self.requester_a.get('purchases/export/'))
+        self.assertEqual(b''.join(response.streaming_content), b'')
+
+        response = view(self.requester_b.get('purchases/export/', {'created_after': 'yesterday'}))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_duplicate_purchase(self):
+        app = mixer.blend(App, user=self.user_a, price=20)
+        other_app = mixer.blend(App, user=self.user_a, price=5)
+        view = PurchaseViewsets.as_view({'post': 'create'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = view(self.requester_b.post('purchases/', data={'app': app.id}, content_type='application/json'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = view(self.requester_b.post('purchases/', data={'app': app.id}, content_type='application/json'))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        # an outdated cache does not decide, the purchase is caught under the wallet lock
+        key, version_key = entitlements.cache_keys(self.user_b.id)
+        entitlements.get_cache().set_many({version_key: 'outdated', key: ('outdated', frozenset())})
+        response = view(self.requester_b.post('purchases/', data={'app': app.id}, content_type='application/json'))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        response = PurchaseViewsets.as_view({'post': 'bulk'})(
+            self.requester_b.post('purchases/bulk/', data={'apps': [app.id, other_app.id]},
+                                  content_type='application/json')
+        )
+        self.assertEqual([result['status_code'] for result in response.data], [409, 200])
+        self.assertEqual(Purchase.objects.filter(issued_by=self.user_b).count(), 2)
+
+    def test_entitlements_read_during_purchase(self):
+        app = mixer.blend(App, user=self.user_a, price=1)
+        self.assertEqual(entitlements.owned(self.user_b.id), frozenset())
+        key, version_key = entitlements.cache_keys(self.user_b.id)
+        version = entitlements.get_cache().get(version_key)
+
+        # a read which loaded before the purchase committed stores its ids after the invalidation
+        mixer.blend(Purchase, issued_by=self.user_b, app=app, price=1)
+        entitlements.invalidate(self.user_b.id)
+        entitlements.get_cache().set(key, (version, frozenset()))
+
+        self.assertEqual(entitlements.owned(self.user_b.id), {app.id})
+
+    def test_entitlements(self):
+        apps = mixer.cycle(count=3).blend(App, user=self.user_a, price=1)
+        mixer.blend(Purchase, issued_by=self.user_b, app=apps[0], price=1)
+        list_view = EntitlementViewsets.as_view({'get': 'list'})
+        check_view = EntitlementViewsets.as_view({'post': 'check'})
+
+        self.assertEqual(list_view(self.requester_b.get('entitlements/')).data, {'apps': [apps[0].id]})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PurchaseViewsets.as_view({'post': 'create'})(
+                self.requester_b.post('purchases/', data={'app': apps[1].id}, content_type='application/json')
+            )
+
+        data = {'apps': [app.id for app in apps] + [0]}
+        check_view(self.requester_b.post('entitlements/check/', data=data, content_type='application/json'))
+        # the owned apps and the user flags are cached by now
+        with self.assertNumQueries(0):
+            response = check_view(
+                self.requester_b.post('entitlements/check/', data=data, content_type='application/json')
+            )
+
+        self.assertEqual(response.data, {'owned': [apps[0].id, apps[1].id], 'not_owned': [0, apps[2].id]})
+        self.assertEqual(list_view(self.requester_a.get('entitlements/')).data, {'apps': []})
+
+        response = check_view(
+            self.requester_b.post('entitlements/check/', data={'apps': []}, content_type='application/json')
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_verify_access(self):
+        app = mixer.blend(App, user=self.user_a, price=1)
+        mixer.blend(Purchase, issued_by=self.user_b, app=app, price=1)
+        view = AccessVerifyView.as_view()
+
+        def verify(requester, access_key):
+            return view(
+                requester.post('access/verify/', data={'access_key': access_key}, content_type='application/json')
+            )
+
+        self.assertEqual(verify(self.requester_b, app.access_key).data, {'allowed': True, 'app': app.id})
+        self.assertEqual(verify(self.requester_a, app.access_key).data, {'allowed': True, 'app': app.id})
+        self.assertEqual(verify(self.requester_b, 'unknown').data, {'allowed': False, 'app': None})
+        # the index, the owned apps and the user flags are loaded by now
+        with self.assertNumQueries(0):
+            self.assertEqual(verify(self.requester_b, app.access_key).data['allowed'], True)
+
+        other_app = mixer.blend(App, user=self.user_a)
+        with self.captureOnCommitCallbacks(execute=True):
+            other_app.save()
+        self.assertEqual(verify(self.requester_b, other_app.access_key).data, {'allowed': False, 'app': None})
+
+        # changed by another worker, picked up by the next sync
+        App.objects.filter(pk=app.pk).update(access_key='rotated', updated_at=datetime.now(timezone.utc))
+        access.access_index.synced_at = 0
+        self.assertEqual(verify(self.requester_b, app.access_key).data['allowed'], False)
+        self.assertEqual(verify(self.requester_b, 'rotated').data, {'allowed': True, 'app': app.id})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            App.objects.filter(pk=app.pk).delete()
+        self.assertEqual(verify(self.requester_a, 'rotated').data['allowed'], False)
+
+        self.assertEqual(verify(self.requester_b, '').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_access_deleted_elsewhere(self):
+        app = mixer.blend(App, user=self.user_a)
+        index = access.AccessKeyIndex()
+        self.assertEqual(index.lookup(app.access_key), (app.id, self.user_a.id))
+
+        # the signals of this process only reach the shared index, not the one of another worker
+        App.objects.filter(pk=app.pk).delete()
+        index.synced_at = 0
+
+        self.assertIsNone(index.lookup(app.access_key))
+
+    def test_sales_rollup(self):
+        app = mixer.blend(App, user=self.user_a, price=20)
+        other_app = mixer.blend(App, user=self.user_a, price=5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PurchaseViewsets.as_view({'post': 'create'})(
+                self.requester_b.post('purchases/', data={'app': app.id}, content_type='application/json')
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            PurchaseViewsets.as_view({'post': 'bulk'})(
+                self.requester_b.post('purchases/bulk/', data={'apps': [other_app.id]}, content_type='application/json')
+            )
+
+        today = datetime.now(timezone.utc).date()
+        self.assertEqual(
+            list(DailySales.objects.order_by('app').values_list('app', 'day', 'count', 'revenue')),
+            [(app.id, today, 1, 20), (other_app.id, today, 1, 5)]
+        )
+
+        view = AppViewsets.as_view({'get': 'sales'})
+        # the user flags, the app and its rollups, the purchases are not read
+        with self.assertNumQueries(3):
+            response = view(self.requester_a.get(f'apps/{app.id}/sales/'), pk=app.id)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['count'], response.data['revenue']), (1, 20))
+        self.assertEqual(response.data['days'][0]['day'], today.isoformat())
+
+        response = view(self.requester_b.get(f'apps/{app.id}/sales/'), pk=app.id)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = view(self.requester_a.get(f'apps/{app.id}/sales/', {'since': '2020-01-01'}), pk=app.id)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sales_rollup_failure(self):
+        app = mixer.blend(App, user=self.user_a, price=20)
+        entitlements.owned(self.user_b.id)
+
+        with mock.patch('apps.core.sales.record', side_effect=RuntimeError), self.assertLogs('django.test', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = PurchaseViewsets.as_view({'post': 'create'})(
+                    self.requester_b.post('purchases/', data={'app': app.id}, content_type='application/json')
+                )
+
+        # charged, the rollup is left to the rollup_sales command and the buyer still gets the app
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(DailySales.objects.exists())
+        self.assertEqual(entitlements.owned(self.user_b.id), {app.id})
+
+    def test_rollup_sales_command(self):
+        app = mixer.blend(App, user=self.user_a)
+        purchases = mixer.cycle(count=3).blend(Purchase, issued_by=self.user_b, app=app, price=2)
+        Purchase.objects.filter(pk=purchases[0].pk).update(created_at=datetime(2023, 1, 1, 23, tzinfo=timezone.utc))
+        today = datetime.now(timezone.utc).date()
+        mixer.blend(DailySales, app=app, day=today, count=10, revenue=10)
+
+        call_command('rollup_sales', stdout=StringIO())
+
+        self.assertEqual(
+            list(DailySales.objects.values_list('day', 'count', 'revenue')),
+            [(date(2023, 1, 1), 1, 2), (today, 2, 4)]
+        )
+
     def test_retrieve_purchase(self):
         app_price = 20
         app = mixer.blend(App, user=self.user_a, price=app_price)
@@ -198,3 +696,660 @@ class TestPurchaseViewset(WithAuthTestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['id'], purchase.id)
         self.assertEqual(response.data['app']['id'], app.id)
+
+
+class TestUpload(WithAuthTestCase):
+    def setUp(self) -> None:
+        self.media = tempfile.TemporaryDirectory()
+        self.settings = override_settings(MEDIA_ROOT=self.media.name, ICON_WORKERS=0)
+        self.settings.enable()
+
+        with mixer.ctx(commit=False) as mx:
+            user = mx.blend(User, active=True)
+            self.tokens = self.get_token({
+                'username': user.username,
+                'email': user.email,
+                'password': user.password,
+                'password_confirmation': user.password,
+            })
+
+            self.requester = RequestFactory(headers={
+                'Authorization': f'JWT {self.tokens["access"]}'
+            })
+
+    def tearDown(self) -> None:
+        self.settings.disable()
+        self.media.cleanup()
+
+    def png(self, color='red'):
+        buffer = BytesIO()
+        Image.new('RGB', (600, 300), color).save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def upload(self, name, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = Upload.as_view()(self.requester.post('upload/', {'file': SimpleUploadedFile(name, content)}))
+        return response
+
+    def test_upload_icon(self):
+        response = self.upload('icon.png', self.png())
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'pending')
+
+        response = UploadDetail.as_view()(self.requester.get('upload/'), pk=response.data['id'])
+
+        self.assertEqual(response.data['status'], 'ready')
+        self.assertEqual(set(response.data['renditions']), {'512', '256', '128', '64'})
+        self.assertTrue(response.data['renditions']['64']['webp'].startswith('http://testserver/'))
+
+        icon = UploadedIcon.objects.get()
+        with Image.open(f'{self.media.name}/{icon.file.name[:-4]}/128.png') as rendition:
+            self.assertEqual(rendition.size, (128, 64))
+
+    def test_upload_broken_icon(self):
+        with self.assertLogs('apps.core.icons', 'ERROR'):
+            response = self.upload('icon.png', b'not an image')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(UploadedIcon.objects.get().status, 'failed')
+
+        response = self.upload('icon.txt', b'not an image')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_deduplication(self):
+        first = self.upload('icon.png', self.png())
+        second = self.upload('copy.PNG', self.png())
+        other = self.upload('icon.png', self.png('blue'))
+
+        self.assertEqual(IconBlob.objects.count(), 2)
+        self.assertEqual(second.data['status'], 'ready')
+        self.assertEqual(second.data['url'], first.data['url'])
+        self.assertEqual(second.data['renditions'], UploadDetail.as_view()(
+            self.requester.get('upload/'), pk=first.data['id']
+        ).data['renditions'])
+        self.assertNotEqual(other.data['url'], first.data['url'])
+
+    def test_collect_icon_blobs(self):
+        self.upload('icon.png', self.png())
+        blob = IconBlob.objects.get()
+        # still shown by an app once its upload is gone
+        self.upload('kept.png', self.png('blue'))
+        kept = IconBlob.objects.exclude(id=blob.id).get()
+        mixer.blend(App, icon=f'https://example.com/{kept.file.name}?size=64')
+        UploadedIcon.objects.all().delete()
+
+        call_command('collect_icon_blobs', min_age=0, stdout=StringIO())
+
+        self.assertEqual(list(IconBlob.objects.all()), [kept])
+        self.assertFalse(os.path.exists(f'{self.media.name}/{blob.file.name}'))
+        self.assertFalse(os.path.exists(f'{self.media.name}/{blob.file.name[:-4]}/64.png'))
+
+    def test_collect_reuploaded_icon_blob(self):
+        self.upload('icon.png', self.png())
+        blob = IconBlob.objects.get()
+        UploadedIcon.objects.all().delete()
+
+        # uploaded again after the blob was picked as a candidate
+        self.upload('copy.png', self.png())
+        self.assertFalse(CollectIconBlobs().collect(blob.id))
+
+        self.assertTrue(IconBlob.objects.filter(id=blob.id).exists())
+        self.assertTrue(os.path.exists(f'{self.media.name}/{blob.file.name}'))
+
+
+@override_settings(PROFILING=True, PROFILING_SAMPLE_RATE=1, PROFILING_SLOW_MS=60 * 1000)
+class TestProfiling(WithAuthTestCase):
+    def setUp(self) -> None:
+        with mixer.ctx(commit=False) as mx:
+            user = mx.blend(User, active=True)
+            self.tokens = self.get_token({
+                'username': user.username,
+                'email': user.email,
+                'password': user.password,
+                'password_confirmation': user.password,
+            })
+
+        self.user = User.objects.get(username=user.username)
+        self.client.credentials(HTTP_AUTHORIZATION=f'JWT {self.tokens["access"]}')
+        profiling.reset()
+
+    def test_request_is_profiled(self):
+        mixer.cycle(count=3).blend(App, user=self.user)
+
+        with self.assertLogs('appstore.profiling', 'INFO') as logs:
+            response = self.client.get('/api/apps/')
+
+        record = json.loads(logs.records[-1].getMessage())
+        timing = response['Server-Timing']
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(f'db;dur={record["db_ms"]:.3f};desc="{record["queries"]} queries"', timing)
+        self.assertIn('serializer;dur=', timing)
+        self.assertIn('auth;dur=', timing)
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['serializer_ms'], 0)
+        self.assertEqual(record['status'], status.HTTP_200_OK)
+        self.assertEqual(record['endpoint'], 'GET /api/apps/')
+
+    def test_stats(self):
+        User.objects.filter(id=self.user.id).update(is_staff=True)
+
+        with self.assertLogs('appstore.profiling', 'INFO'):
+            for _ in range(3):
+                self.client.get('/api/apps/')
+            response = self.client.get('/api/stats/')
+
+        apps = response.data['requests']['GET /api/apps/']
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(apps['count'], 3)
+        self.assertLessEqual(apps['p50_ms'], apps['p99_ms'])
+        self.assertIn('mean_queries', apps)
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_unsampled(self):
+        response = self.client.get('/api/apps/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(profiling.stats(), {})
+
+    def test_duplicate_fingerprint(self):
+        self.assertEqual(
+            profiling.fingerprint('SELECT 1 FROM "core_app" WHERE "id" IN (%s, %s, %s)'),
+            profiling.fingerprint('SELECT 1 FROM "core_app" WHERE "id" IN (%s, %s)'),
+        )
+
+
+@override_settings(PAGE_SIZE=5)
+class TestAsyncViews(WithAuthTestCase):
+    def setUp(self) -> None:
+        caches['catalogue'].clear()
+
+        with mixer.ctx(commit=False) as mx:
+            user = mx.blend(User, active=True)
+            self.tokens = self.get_token({
+                'username': user.username,
+                'email': user.email,
+                'password': user.password,
+                'password_confirmation': user.password,
+            })
+
+        self.user = User.objects.get(username=user.username)
+        self.other_user = mixer.blend(User, active=True)
+        self.apps = mixer.cycle(count=7).blend(App, user=self.user, verified=True)
+        self.other_app = mixer.blend(App, user=self.other_user, verified=True)
+        self.purchases = mixer.cycle(count=3).blend(Purchase, issued_by=self.user, app=self.other_app)
+
+        self.headers = {'Authorization': f'JWT {self.tokens["access"]}'}
+        self.requester = RequestFactory(headers=self.headers)
+        # headers given to AsyncRequestFactory itself are not sent on django 4.2
+        self.async_requester = AsyncRequestFactory()
+
+    async def test_applist_matches_sync(self):
+        view = AsyncAppViewsets.as_view({'get': 'list'})
+        sync_view = sync_to_async(AppViewsets.as_view({'get': 'list'}))
+
+        for query in ({}, {'page': 2}, {'page': 'last'}, {'pagination': 'cursor'}):
+            response = await view(self.async_requester.get('/apps/', query, headers=self.headers))
+            expected = await sync_view(self.requester.get('/apps/', query))
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data, expected.data)
+
+    async def test_applist_invalid_page(self):
+        view = AsyncAppViewsets.as_view({'get': 'list'})
+        response = await view(self.async_requester.get('apps/', {'page': 9}, headers=self.headers))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_retrieve_app(self):
+        view = AsyncAppViewsets.as_view({'get': 'retrieve'})
+
+        response = await view(self.async_requester.get('apps/', headers=self.headers), pk=self.apps[0].id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], self.apps[0].id)
+
+        response = await view(self.async_requester.get('apps/', headers=self.headers), pk=self.other_app.id)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_purchases(self):
+        view = AsyncPurchaseViewsets.as_view({'get': 'list'})
+        response = await view(self.async_requester.get('purchases/', headers=self.headers))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], len(self.purchases))
+        self.assertEqual(response.data['results'][0]['app']['id'], self.other_app.id)
+
+        response = await AsyncPurchaseViewsets.as_view({'get': 'retrieve'})(
+            self.async_requester.get('purchases/', headers=self.headers), pk=self.purchases[0].id
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['id'], self.purchases[0].id)
+
+    async def test_verified(self):
+        view = AsyncVerifiedAppsView.as_view()
+        response = await view(self.async_requester.get('apps/verified/', headers=self.headers))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([app['id'] for app in response.data['results']], [self.other_app.id])
+
+    async def test_sync_handler(self):
+        request = self.async_requester.post('apps/', {
+            'title': 'Async', 'description': 'created through the async viewset', 'price': 3,
+            'access_link': 'https://example.com/',
+        }, content_type='application/json', headers=self.headers)
+        response = await AsyncAppViewsets.as_view({'post': 'create'})(request)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(await App.objects.filter(user=self.user, title='Async').aexists())
+
+    async def test_unauthenticated(self):
+        response = await AsyncAppViewsets.as_view({'get': 'list'})(AsyncRequestFactory().get('apps/'))
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(STREAM_CHUNK_SIZE=3)
+    async def test_purchases_stream(self):
+        view = AsyncPurchaseViewsets.as_view({'get': 'list'})
+        response = await view(self.async_requester.get('purchases/', {'pagination': 'stream'}, headers=self.headers))
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        expected = await sync_to_async(lambda: PurchaseReadSerializer(self.purchases, many=True).data)()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(content, JSONRenderer().render(expected))
+
+    async def test_export(self):
+        view = AsyncPurchaseViewsets.as_view({'get': 'export'})
+        response = await view(self.async_requester.get('purchases/export/', headers=self.headers))
+        lines = b''.join([chunk async for chunk in response.streaming_content]).splitlines()
+        expected = await sync_to_async(lambda: PurchaseReadSerializer(self.purchases, many=True).data)()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([json.loads(line) for line in lines], json.loads(JSONRenderer().render(expected)))
+
+        response = await AsyncAppViewsets.as_view({'get': 'export'})(
+            self.async_requester.get('apps/export/', {'output': 'csv'}, headers=self.headers)
+        )
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(len(list(csv.DictReader(StringIO(content)))), len(self.apps))
+
+
+# Plan fragments of a lookup through the named index, and of a scan or a sort the index should have saved,
+# per vendor
+INDEX_SEARCH_PATTERNS = {
+    'sqlite': r'\bSEARCH {table} USING (?:COVERING )?INDEX {index}\b',
+    'postgresql': r'\b(?:Index Scan|Index Only Scan|Bitmap Index Scan) (?:using|on) {index}\b',
+}
+FULL_SCAN_PATTERNS = {
+    'sqlite': (re.compile(r'\bSCAN\b'), re.compile(r'USE TEMP B-TREE')),
+    'postgresql': (re.compile(r'\bSeq Scan\b'), re.compile(r'\bSort\b')),
+}
+
+
+@skipUnless(connection.vendor in FULL_SCAN_PATTERNS, 'EXPLAIN output is only parsed for SQLite and PostgreSQL')
+class TestQueryPlans(TestCase):
+    """
+    EXPLAINs the hot queries of the views over seeded data, each of them has to look its rows up through
+    its index, none may scan or sort a whole table. The data is large enough for the planner to prefer the
+    indexes on its own.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = User.objects.bulk_create(User(username=f'plan-{i}', password='') for i in range(200))
+        Wallet.objects.bulk_create(Wallet(user=user) for user in cls.users)
+        App.objects.bulk_create(
+            App(user=user, title=f'app {i}', description='', access_link='https://example.com', verified=i % 2 == 0)
+            for user in cls.users for i in range(50)
+        )
+
+        apps = list(App.objects.all()[:10])
+        Purchase.objects.bulk_create(
+            Purchase(app=app, issued_by=user, price=app.price) for user in cls.users for app in apps
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def hot_queries(self):
+        """The query, its table and a pattern of the indexes it may go through"""
+
+        user = self.users[0]
+        last_id = App.objects.filter(verified=True).order_by('id').values_list('id', flat=True)[100]
+        return {
+            'apps': (App.objects.filter(user=user), App, 'app_user_id'),
+            # the verified pages after the first one, read in cursor mode
+            'verified': (
+                App.objects.filter(verified=True, id__gt=last_id).exclude(user=user.id).order_by('id'),
+                App, 'app_verified_id'
+            ),
+            'purchases': (
+                Purchase.objects.filter(issued_by=user).select_related('app'), Purchase, 'purchase_issued_by_id'
+            ),
+            'wallet': (Wallet.objects.select_for_update().filter(user=user.id), Wallet, r'\w+'),
+        }
+
+    def test_index_lookups(self):
+        for name, (qs, model, index) in self.hot_queries().items():
+            with self.subTest(name):
+                plan = qs[:settings.PAGE_SIZE].explain()
+                search = INDEX_SEARCH_PATTERNS[connection.vendor].format(table=model._meta.db_table, index=index)
+                self.assertRegex(plan, search, f'{name} is not looked up through an index:\n{plan}')
+                for pattern in FULL_SCAN_PATTERNS[connection.vendor]:
+                    self.assertIsNone(pattern.search(plan), f'{name} falls back to a full scan:\n{plan}')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class TestReplicaRouting(TestCase):
+    def setUp(self) -> None:
+        caches[routers.CACHE_ALIAS].clear()
+        self.user = mixer.blend(User)
+        self.router = routers.ReplicaRouter()
+        self.seen = []
+
+        router, seen = self.router, self.seen
+
+        class View:
+            @routers.replica_reads
+            def get(self, request):
+                seen.append((router.db_for_read(App), router.db_for_read(Wallet)))
+                return HttpResponse()
+
+            @routers.replica_reads
+            async def aget(self, request):
+                seen.append(router.db_for_read(App))
+                return HttpResponse()
+
+            def post(self, request):
+                seen.append(router.db_for_read(App))
+                router.db_for_write(Purchase)
+                return HttpResponse()
+
+        self.view = View()
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+
+    def test_replica_reads(self):
+        ReplicaRoutingMiddleware(self.view.get)(self.request)
+        self.assertEqual(self.seen, [('replica', 'default')])
+
+        # outside of a request, management commands and the like
+        self.assertEqual(self.router.db_for_read(App), 'default')
+
+    def test_pinned_after_write(self):
+        ReplicaRoutingMiddleware(self.view.post)(self.request)
+        ReplicaRoutingMiddleware(self.view.get)(self.request)
+
+        self.assertEqual(self.seen, ['default', ('default', 'default')])
+        self.assertTrue(routers.is_pinned(self.user.id))
+
+        caches[routers.CACHE_ALIAS].clear()
+        ReplicaRoutingMiddleware(self.view.get)(self.request)
+        self.assertEqual(self.seen[-1], ('replica', 'default'))
+
+    def test_catalogue_reads_primary(self):
+        class View:
+            @routers.replica_reads
+            def get(self, request):
+                return HttpResponse(catalogue.VerifiedCatalogue('', request.user.id).get_queryset().db)
+
+        response = ReplicaRoutingMiddleware(View().get)(self.request)
+        self.assertEqual(response.content, b'default')
+
+    async def test_async(self):
+        await ReplicaRoutingMiddleware(self.view.aget)(self.request)
+        self.assertEqual(self.seen, ['replica'])
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ReplicaRoutingMiddleware(self.view.get)
+        self.view.get(self.request)
+        self.assertEqual(self.seen, [('default', 'default')])
+
+    def test_process_local_pins(self):
+        local = {**settings.CACHES, routers.CACHE_ALIAS: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=local), self.assertRaises(ImproperlyConfigured):
+            ReplicaRoutingMiddleware(self.view.get)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeTransactionConnection(FakeConnection):
+    """Opens a transaction with the first query, the way psycopg2 does outside autocommit"""
+
+    def __init__(self):
+        super().__init__()
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def cursor(self):
+        return nullcontext(self)
+
+    def execute(self, sql):
+        self.status = extensions.TRANSACTION_STATUS_INTRANS
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+
+class TestConnectionPool(SimpleTestCase):
+    def test_reuse(self):
+        pool = ConnectionPool(FakeConnection, size=2)
+        connection = pool.acquire()
+        pool.release(connection)
+
+        self.assertIs(pool.acquire(), connection)
+        self.assertIsNot(pool.acquire(), connection)
+        self.assertEqual(pool.stats(), {'size': 2, 'open': 2, 'idle': 0})
+
+    def test_timeout(self):
+        pool = ConnectionPool(FakeConnection, size=1, timeout=0.05)
+        connection = pool.acquire()
+
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+
+        threading.Timer(0.01, pool.release, (connection,)).start()
+        pool.timeout = 5
+        self.assertIs(pool.acquire(), connection)
+
+    def test_replaced_connections(self):
+        pool = ConnectionPool(FakeConnection, size=1, max_lifetime=60, check=lambda connection: not connection.broken)
+
+        connection = pool.acquire()
+        connection.broken = False
+        pool.opened_at[id(connection)] -= 60
+        pool.release(connection)
+        self.assertTrue(connection.closed)
+
+        connection = pool.acquire()
+        connection.broken = True
+        pool.release(connection)
+        replacement = pool.acquire()
+
+        self.assertTrue(connection.closed)
+        self.assertIsNot(replacement, connection)
+        self.assertEqual(pool.stats()['open'], 1)
+
+    def test_failed_reset(self):
+        def reset(connection):
+            raise ValueError()
+
+        pool = ConnectionPool(FakeConnection, size=1, reset=reset)
+        connection = pool.acquire()
+        pool.release(connection)
+
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats()['open'], 0)
+
+    def test_health_check_leaves_no_transaction(self):
+        connection = FakeTransactionConnection()
+
+        self.assertTrue(is_usable(connection))
+        self.assertEqual(connection.get_transaction_status(), extensions.TRANSACTION_STATUS_IDLE)
+
+    def test_failed_connect(self):
+        def connect():
+            raise OSError()
+
+        pool = ConnectionPool(connect, size=1, timeout=0)
+        for _ in range(2):
+            with self.assertRaises(OSError):
+                pool.acquire()
+
+
+class TestTokenBucketStore(SimpleTestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.store = TokenBucketStore(os.path.join(directory.name, 'throttle.sqlite3'))
+
+    def test_take(self):
+        # 3 requests per minute, a token every 20 seconds
+        self.assertEqual([self.store.take('a', 3, 0.05)[0] for _ in range(4)], [True, True, True, False])
+        self.assertTrue(self.store.take('b', 3, 0.05)[0])
+
+        allowed, wait = self.store.take('a', 3, 0.05)
+        self.assertFalse(allowed)
+        self.assertAlmostEqual(wait, 20, delta=1)
+
+        self.store.get_connection().execute("UPDATE buckets SET updated_at = updated_at - 21 WHERE key = 'a'")
+        self.assertEqual([self.store.take('a', 3, 0.05)[0] for _ in range(2)], [True, False])
+
+        # never refilled past the capacity
+        self.store.get_connection().execute("UPDATE buckets SET updated_at = updated_at - 3600 WHERE key = 'a'")
+        self.assertEqual([self.store.take('a', 3, 0.05)[0] for _ in range(4)], [True, True, True, False])
+
+    def test_prune(self):
+        self.store.take('a', 3, 0.05)
+        self.store.take('b', 3, 0.05)
+        self.store.get_connection().execute(
+            "UPDATE buckets SET updated_at = updated_at - 2 * 24 * 60 * 60 WHERE key = 'a'"
+        )
+        self.store.prune()
+
+        self.assertEqual(self.store.get_connection().execute('SELECT key FROM buckets').fetchall(), [('b',)])
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class TestCatalogueTransfer(TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def snapshot(self):
+        return (
+            list(User.objects.order_by('username').values_list('username', 'email', 'password', 'is_staff')),
+            list(Wallet.objects.order_by('user__username').values_list('user__username', 'balance')),
+            list(App.objects.order_by('access_key').values_list('user__username', 'title', 'access_key', 'verified',
+                                                                'price', 'icon')),
+        )
+
+    def test_round_trip(self):
+        users = mixer.cycle(count=3).blend(User, password=mixer.sequence(lambda i: make_password(f'secret-{i}')))
+        for user in users:
+            wallet = mixer.blend(Wallet, user=user, balance=10)
+        WalletShard.objects.create(wallet=wallet, index=0, balance=5)
+        mixer.cycle(count=5).blend(App, user=mixer.SELECT, verified=mixer.sequence(True, False), icon=None)
+
+        users_before, wallets_before, apps_before = self.snapshot()
+        # the shard credits are folded into the balance
+        wallets_before = [(name, 15 if name == users[-1].username else balance) for name, balance in wallets_before]
+
+        for file_format in ('ndjson', 'csv'):
+            directory = os.path.join(self.directory, file_format)
+            call_command('export_catalogue', directory, format=file_format, chunk_size=2, stdout=StringIO())
+            User.objects.all().delete()
+            call_command('import_catalogue', directory, batch_size=2, stdout=StringIO())
+
+            self.assertEqual(self.snapshot(), (users_before, wallets_before, apps_before))
+
+        # imported again, every row is already there
+        call_command('import_catalogue', directory, batch_size=2, stdout=StringIO())
+        self.assertEqual(self.snapshot(), (users_before, wallets_before, apps_before))
+        self.assertTrue(User.objects.get(username=users[0].username).check_password('secret-0'))
+
+    def test_raw_passwords(self):
+        mixer.blend(User, username='taken')
+        with open(os.path.join(self.directory, 'users.csv'), 'w', newline='') as f:
+            f.write('username,email,raw_password\nalice,alice@example.com,Alice-Passw0rd\nbob,,\ntaken,,x\n')
+        with open(os.path.join(self.directory, 'apps.ndjson'), 'w') as f:
+            f.write(json.dumps({'username': 'alice', 'title': 'App', 'access_link': 'https://example.com'}) + '\n')
+            f.write(json.dumps({'username': 'nobody', 'title': 'Orphan', 'access_link': 'https://example.com'}) + '\n')
+
+        # per batch the existing users or owners and the inserts, no access key to look up
+        with self.assertNumQueries(8):
+            call_command('import_catalogue', self.directory, batch_size=10, stdout=StringIO())
+
+        self.assertTrue(User.objects.get(username='alice').check_password('Alice-Passw0rd'))
+        self.assertFalse(User.objects.get(username='bob').has_usable_password())
+        self.assertEqual(list(App.objects.values_list('user__username', 'title')), [('alice', 'App')])
+        self.assertTrue(App.objects.get().access_key)
+
+
+class TestListSerializers(TestCase):
+    def setUp(self) -> None:
+        self.user = mixer.blend(User)
+        self.apps = [
+            mixer.blend(App, user=self.user, icon=None),
+            mixer.blend(App, user=self.user, icon=''),
+            mixer.blend(App, user=self.user, icon='https://example.com/icon.png', price=9.99),
+        ]
+        self.purchases = [mixer.blend(Purchase, issued_by=self.user, app=app, price=app.price) for app in self.apps]
+        mixer.blend(Purchase, issued_by=self.user, app=mixer.blend(App, user=self.user)).app.delete()
+
+    def assertSameJSON(self, fast, slow):
+        self.assertEqual(JSONRenderer().render(fast.data), JSONRenderer().render(slow.data))
+
+    def test_apps(self):
+        qs = App.objects.order_by('id')
+
+        for context in ({}, {'scope': 'public'}):
+            self.assertSameJSON(
+                AppListSerializer(AppListSerializer.prepare(qs), many=True, context=context),
+                AppReadSerializer(qs, many=True, context=context),
+            )
+
+    def test_purchases(self):
+        qs = Purchase.objects.order_by('id')
+
+        self.assertSameJSON(
+            PurchaseListSerializer(PurchaseListSerializer.prepare(qs), many=True),
+            PurchaseReadSerializer(qs, many=True),
+        )
+        self.assertIsNone(PurchaseListSerializer(PurchaseListSerializer.prepare(qs)).data[-1]['app'])
+
+
+class TestFastJSONRenderer(SimpleTestCase):
+    data = {
+        'id': 1,
+        'price': 9.99,
+        'title': 'caf\u00e9 \u2028 \U0001f600',
+        'created_at': datetime(2023, 8, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+        'amount': Decimal('1.50'),
+        'key': UUID('12345678-1234-5678-1234-567812345678'),
+        'renditions': {64: {'png': '/media/icons/64.png'}},
+        'apps': [None, True, [1, 2]],
+    }
+
+    def test_matches_json_renderer(self):
+        for backend in ('orjson', 'json'):
+            with self.subTest(backend=backend), override_settings(JSON_BACKEND=backend):
+                self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_indent(self):
+        self.assertEqual(
+            FastJSONRenderer().render(self.data, 'application/json; indent=4'),
+            JSONRenderer().render(self.data, 'application/json; indent=4'),
+        )
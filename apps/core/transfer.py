@@ -0,0 +1,169 @@
+import csv
+import json
+
+from types import SimpleNamespace
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F, FloatField, Sum, Value
+from django.db.models.functions import Coalesce
+from apps.authenticate import hashers
+from apps.core import catalogue
+from apps.core.models import App, Wallet
+from appstore.renderers import chunked
+
+USER_COLUMNS = ('username', 'email', 'password', 'is_active', 'is_staff', 'is_superuser', 'date_joined')
+WALLET_COLUMNS = ('username', 'balance', 'unit')
+APP_COLUMNS = ('username', 'title', 'description', 'icon', 'access_link', 'access_key', 'verified', 'price', 'unit')
+
+
+def export_users(chunk_size):
+    return User.objects.order_by('id').values(*USER_COLUMNS).iterator(chunk_size=chunk_size)
+
+
+def export_wallets(chunk_size):
+    # the seller credits still spread over the shards are folded into the exported balance
+    qs = Wallet.objects.order_by('id').annotate(
+        owner=F('user__username'),
+        total=F('balance') + Coalesce(Sum('shards__balance'), Value(0.0), output_field=FloatField()),
+    ).values_list('owner', 'total', 'unit')
+    return (dict(zip(WALLET_COLUMNS, row)) for row in qs.iterator(chunk_size=chunk_size))
+
+
+def export_apps(chunk_size):
+    qs = App.objects.order_by('id').values(*APP_COLUMNS[1:], username=F('user__username'))
+    return qs.iterator(chunk_size=chunk_size)
+
+
+def convert(model, row, columns):
+    """Model values out of a CSV or NDJSON row, empty values are null or left to the field default"""
+
+    values = {}
+    for column in columns:
+        if column == 'username' or column not in row:
+            continue
+        field, value = model._meta.get_field(column), row[column]
+        if value in ('', None):
+            if field.null:
+                values[column] = None
+        else:
+            values[column] = field.to_python(value)
+    return values
+
+
+def user_ids(usernames):
+    return dict(User.objects.filter(username__in=set(usernames)).values_list('username', 'id'))
+
+
+def import_users(rows):
+    """
+    Rows carry either the ``password`` hash of an export, kept as is, or a ``raw_password`` hashed in the
+    hashing pool. Users without either get an unusable password, existing usernames are skipped.
+    """
+
+    existing = set(user_ids(row['username'] for row in rows))
+    rows = list({row['username']: row for row in rows if row['username'] not in existing}.values())
+
+    raw = [row for row in rows if not row.get('password') and row.get('raw_password')]
+    for row, encoded in zip(raw, hashers.make_passwords([row['raw_password'] for row in raw])):
+        row['password'] = encoded
+
+    users = []
+    for row in rows:
+        values = convert(User, row, USER_COLUMNS)
+        values['password'] = row.get('password') or make_password(None)
+        users.append(User(username=row['username'], **values))
+
+    User.objects.bulk_create(users)
+    return users
+
+
+def import_wallets(rows):
+    """Wallets of unknown users and of users which already have one are skipped"""
+
+    ids = user_ids(row['username'] for row in rows)
+    taken = set(Wallet.objects.filter(user__in=ids.values()).values_list('user', flat=True))
+
+    wallets = {}
+    for row in rows:
+        user_id = ids.get(row['username'])
+        if user_id is not None and user_id not in taken:
+            wallets[user_id] = Wallet(user_id=user_id, **convert(Wallet, row, WALLET_COLUMNS))
+
+    return Wallet.objects.bulk_create(wallets.values())
+
+
+def import_apps(rows):
+    """Apps of unknown users and apps whose access key is already in the database are skipped"""
+
+    ids = user_ids(row['username'] for row in rows)
+    keys = {row.get('access_key') for row in rows} - {None, ''}
+    taken = set(App.objects.filter(access_key__in=keys).values_list('access_key', flat=True))
+
+    apps = []
+    for row in rows:
+        user_id = ids.get(row['username'])
+        if user_id is None or row.get('access_key') in taken:
+            continue
+        values = convert(App, row, APP_COLUMNS)
+        apps.append(App(user_id=user_id, **values))
+        if values.get('access_key'):
+            taken.add(values['access_key'])
+
+    apps = App.objects.bulk_create(apps)
+    if any(app.verified for app in apps):
+        # bulk_create sends no post_save, the catalogue signal does not run
+        transaction.on_commit(catalogue.invalidate)
+    return apps
+
+
+# in import order, wallets and apps refer to their users by username
+KINDS = {
+    'users': (USER_COLUMNS, export_users, import_users),
+    'wallets': (WALLET_COLUMNS, export_wallets, import_wallets),
+    'apps': (APP_COLUMNS, export_apps, import_apps),
+}
+
+EXTENSIONS = ('ndjson', 'jsonl', 'csv')
+
+
+def read(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.csv'):
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def import_file(kind, path, batch_size):
+    """Inserts the rows of the file ``batch_size`` at a time, one transaction per batch, returns (read, created)"""
+
+    import_batch = KINDS[kind][2]
+    read_rows = created = 0
+
+    for batch in chunked(read(path), batch_size):
+        with transaction.atomic():
+            created += len(import_batch(batch))
+        read_rows += len(batch)
+
+    return read_rows, created
+
+
+def export_file(kind, path, encoder_class, chunk_size):
+    """Writes every row of the kind read ``chunk_size`` at a time, returns how many"""
+
+    columns, export_rows, _ = KINDS[kind]
+    # the encoders only read the columns of the serializer they are given
+    encoder = encoder_class(SimpleNamespace(columns=columns))
+    count = 0
+
+    with open(path, 'wb') as f:
+        f.write(encoder.header())
+        for chunk in chunked(export_rows(chunk_size), chunk_size):
+            f.write(encoder.encode(chunk))
+            count += len(chunk)
+        f.write(encoder.footer())
+
+    return count
@@ -1,12 +1,22 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework.routers import DefaultRouter
-from apps.core.views import AppViewsets, VerifiedAppsView, PurchaseViewsets
+from apps.core import views
+
+if settings.ASYNC_VIEWS:
+    app_views, verified_view, purchase_views = views.AsyncAppViewsets, views.AsyncVerifiedAppsView, \
+        views.AsyncPurchaseViewsets
+else:
+    app_views, verified_view, purchase_views = views.AppViewsets, views.VerifiedAppsView, views.PurchaseViewsets
 
 
 router = DefaultRouter()
-router.register(r'apps', AppViewsets, basename='apps')
-router.register(r'purchases', PurchaseViewsets, basename='purchases')
+router.register(r'apps', app_views, basename='apps')
+router.register(r'purchases', purchase_views, basename='purchases')
+router.register(r'entitlements', views.EntitlementViewsets, basename='entitlements')
 
 urlpatterns = [
-    path('apps/verified/', VerifiedAppsView.as_view()),
+    path('apps/verified/', verified_view.as_view()),
+    path('stats/', views.StatsView.as_view()),
+    path('access/verify/', views.AccessVerifyView.as_view()),
 ] + router.urls
@@ -1,34 +1,44 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
 from django.core.validators import validate_slug
 from django.core.exceptions import ValidationError
 from rest_framework.views import APIView
-from rest_framework import generics, status, viewsets
+from rest_framework import exceptions, generics, status, viewsets
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.permissions import IsAdminUser
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from apps.core.models import App, Purchase
+from apps.core.models import App, Purchase, UploadedIcon, DailySales
+from apps.core.search import search_apps
+from apps.core import access, catalogue, entitlements, icons
+from apps.core.idempotency import idempotent
 from apps.core.serializers import AppReadSerializer, UploadedIconSerializer, AppCreateSerializer, \
     AppUpdateSerializer, PurchaseReadSerializer, PurchaseWriteSerializer, AppPaginationSerializer, \
-    VerifiedPaginationSerializer, PurchasePaginationSerializer
-from appstore.utils import CustomSchemes, PaginatorMixin
+    VerifiedPaginationSerializer, PurchasePaginationSerializer, BulkPurchaseSerializer, BulkPurchaseResultSerializer, \
+    AppListSerializer, PurchaseListSerializer, SalesQuerySerializer, DailySalesSerializer, AppSalesSerializer, \
+    EntitlementCheckSerializer, EntitlementsSerializer, EntitlementCheckResultSerializer, AccessVerifySerializer, \
+    AccessVerifyResultSerializer
+from appstore.utils import CustomSchemes, CustomParameters, PaginatorMixin, ExportMixin, ExportQuerySerializer
+from appstore.async_views import AsyncAPIViewMixin, aget_object_or_404, async_variant
+from appstore import profiling
+from appstore.routers import replica_reads
 
 
-class AppViewsets(viewsets.ViewSet, PaginatorMixin):
+class AppViewsets(viewsets.ViewSet, PaginatorMixin, ExportMixin):
     @swagger_auto_schema(
         operation_description="Paginated list of user created apps",
         responses={
             status.HTTP_200_OK: AppPaginationSerializer
         },
-        manual_parameters=[
-            openapi.Parameter('page', openapi.IN_QUERY, type='int', description='Number of page', required=False)
-        ],
+        manual_parameters=CustomParameters.paginated,
         operation_id="apps"
     )
+    @replica_reads
     def list(self, request):
-        qs = App.objects.filter(user=self.request.user)
-        return self.paginate(qs, request, AppReadSerializer)
+        qs = App.objects.filter(user=self.request.user.id)
+        return self.paginate(qs, request, AppListSerializer)
 
     @swagger_auto_schema(
         operation_description="Retrieve the app",
@@ -38,8 +48,9 @@ class AppViewsets(viewsets.ViewSet, PaginatorMixin):
         },
         operation_id="retrieve app"
     )
+    @replica_reads
     def retrieve(self, request, pk=None):
-        qs = App.objects.filter(pk=pk, user=self.request.user)
+        qs = App.objects.filter(pk=pk, user=self.request.user.id)
         user = get_object_or_404(qs, pk=pk)
         serializer = AppReadSerializer(user)
         return Response(serializer.data)
@@ -83,13 +94,54 @@ class AppViewsets(viewsets.ViewSet, PaginatorMixin):
         operation_id="delete app"
     )
     def destroy(self, request, pk=None):
-        qs = App.objects.filter(pk=pk, user=self.request.user)
+        qs = App.objects.filter(pk=pk, user=self.request.user.id)
         user = get_object_or_404(qs, pk=pk)
         user.delete()
         return Response(status=status.HTTP_200_OK)
 
+    @swagger_auto_schema(
+        operation_description="Daily sales of the app, read from the rollups kept by apps.core.sales",
+        query_serializer=SalesQuerySerializer,
+        responses={
+            status.HTTP_200_OK: AppSalesSerializer,
+            status.HTTP_400_BAD_REQUEST: CustomSchemes.error,
+            status.HTTP_404_NOT_FOUND: CustomSchemes.error
+        },
+        operation_id="app sales"
+    )
+    @action(detail=True, methods=['get'])
+    @replica_reads
+    def sales(self, request, pk=None):
+        app = get_object_or_404(App.objects.filter(user=self.request.user.id).only('id'), pk=pk)
+        params = SalesQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        since, until = params.validated_data['since'], params.validated_data['until']
+
+        days = DailySalesSerializer(DailySales.objects.filter(app=app, day__gte=since, day__lte=until), many=True).data
+        return Response({
+            'since': since,
+            'until': until,
+            'count': sum(day['count'] for day in days),
+            'revenue': sum(day['revenue'] for day in days),
+            'days': days,
+        })
+
+    @swagger_auto_schema(
+        operation_description="Every app of the user streamed as NDJSON, one object per line, or CSV",
+        query_serializer=ExportQuerySerializer,
+        responses={
+            status.HTTP_200_OK: openapi.Response('NDJSON or CSV stream, rows ordered by id'),
+            status.HTTP_400_BAD_REQUEST: CustomSchemes.error
+        },
+        operation_id="export apps"
+    )
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        qs = App.objects.filter(user=self.request.user.id)
+        return self.stream_export(qs, request, AppListSerializer, 'apps')
+
     def do_update(self, pk, is_partial):
-        qs = App.objects.filter(pk=pk, user=self.request.user)
+        qs = App.objects.filter(pk=pk, user=self.request.user.id)
         user = get_object_or_404(qs, pk=pk)
         serializer = AppUpdateSerializer(data=self.request.data, instance=user, partial=is_partial)
         serializer.is_valid(raise_exception=True)
@@ -97,57 +149,104 @@ class AppViewsets(viewsets.ViewSet, PaginatorMixin):
         return Response(status=status.HTTP_200_OK, data=AppReadSerializer(instance=user).data)
 
 
-class VerifiedAppsView(generics.ListAPIView):
+class VerifiedAppsView(PaginatorMixin, generics.ListAPIView):
     serializer_class = AppReadSerializer
 
     @swagger_auto_schema(
         operation_description="Paginated list of verified apps",
         responses={
-            status.HTTP_200_OK: VerifiedPaginationSerializer
+            status.HTTP_200_OK: VerifiedPaginationSerializer,
+            status.HTTP_400_BAD_REQUEST: CustomSchemes.error
         },
         manual_parameters=[
-            openapi.Parameter('search', openapi.IN_QUERY, type='string', description='search item', required=False)
+            openapi.Parameter(
+                'search', openapi.IN_QUERY, type='string', required=False,
+                description='search item, results are ranked by relevance, not available in cursor mode'
+            ),
+            *CustomParameters.paginated
         ],
         operation_id="verified apps"
     )
+    @replica_reads
     def get(self, request, *args, **kwargs):
         return super().get(request, *args, **kwargs)
 
-    def get_queryset(self):
-        qs = App.objects.filter(verified=True).exclude(user=self.request.user.id)
+    def list(self, request, *args, **kwargs):
+        # the keyset is the id, it would throw the relevance ranking away
+        if request.query_params.get('pagination') == 'cursor' and self.get_search_term():
+            raise exceptions.ValidationError({'pagination': ['Cursor pagination cannot be combined with search.']})
+
+        if request.query_params.get('pagination') in ('cursor', 'stream'):
+            return self.paginate(self.get_queryset(), request, AppListSerializer, self.get_serializer_context())
+
+        page = self.paginate_queryset(catalogue.VerifiedCatalogue(self.get_search_term(), self.request.user.id))
+        return self.get_paginated_response(page)
+
+    def get_search_term(self):
         search_param = self.request.GET.get('search')
 
         try:
             validate_slug(search_param)
-            if search_param:
-                qs = qs.filter(
-                    Q(title__icontains=search_param) | Q(description__icontains=search_param)
-                )
         except ValidationError:
-            pass
+            return None
+
+        return search_param
+
+    def get_queryset(self):
+        qs = App.objects.filter(verified=True).exclude(user=self.request.user.id)
+        search_param = self.get_search_term()
+
+        if search_param:
+            qs = search_apps(qs, search_param)
 
         return qs
 
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            self._paginator = self.get_paginator(self.request)
+        return self._paginator
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['scope'] = 'public'
         return context
 
 
-class PurchaseViewsets(viewsets.ViewSet, PaginatorMixin):
+class StatsView(APIView):
+    permission_classes = (IsAdminUser,)
+
+    @swagger_auto_schema(
+        operation_description="Cache statistics of the verified apps catalogue and, when PROFILING is enabled, "
+                              "per endpoint timings of the answering process, slowest first. Admin only",
+        responses={
+            status.HTTP_200_OK: CustomSchemes.stats,
+            status.HTTP_403_FORBIDDEN: CustomSchemes.error
+        },
+        operation_id="stats"
+    )
+    def get(self, request, *args, **kwargs):
+        return Response({'catalogue': catalogue.stats(), 'requests': profiling.stats()})
+
+
+class PurchaseViewsets(viewsets.ViewSet, PaginatorMixin, ExportMixin):
+    def get_throttles(self):
+        # only the writes are throttled, the reads stay cheap
+        self.throttle_scope = 'purchase' if self.action in ('create', 'bulk') else None
+        return super().get_throttles()
+
     @swagger_auto_schema(
         operation_description="Paginated list of purchased apps",
         responses={
             status.HTTP_200_OK: PurchasePaginationSerializer
         },
-        manual_parameters=[
-            openapi.Parameter('page', openapi.IN_QUERY, type='int', description='Number of page', required=False)
-        ],
+        manual_parameters=CustomParameters.paginated,
         operation_id="purchased apps"
     )
+    @replica_reads
     def list(self, request):
-        qs = Purchase.objects.filter(issued_by=self.request.user).select_related('app')
-        return self.paginate(qs, request, PurchaseReadSerializer)
+        qs = Purchase.objects.filter(issued_by=self.request.user.id)
+        return self.paginate(qs, request, PurchaseListSerializer)
 
     @swagger_auto_schema(
         operation_description="Retrieve the purchase detail",
@@ -158,8 +257,9 @@ class PurchaseViewsets(viewsets.ViewSet, PaginatorMixin):
         },
         operation_id="retrieve purchase"
     )
+    @replica_reads
     def retrieve(self, request, pk=None):
-        qs = Purchase.objects.filter(pk=pk, issued_by=self.request.user).select_related('app')
+        qs = Purchase.objects.filter(pk=pk, issued_by=self.request.user.id).select_related('app')
         obj = get_object_or_404(qs, pk=pk)
         serializer = PurchaseReadSerializer(obj)
         return Response(serializer.data)
@@ -168,9 +268,12 @@ class PurchaseViewsets(viewsets.ViewSet, PaginatorMixin):
         operation_description="Purchase an app",
         responses={
             status.HTTP_200_OK: PurchaseReadSerializer,
+            status.HTTP_429_TOO_MANY_REQUESTS: CustomSchemes.error
         },
+        manual_parameters=[CustomParameters.idempotency_key],
         operation_id="purchase app"
     )
+    @idempotent
     def create(self, request):
         request.data['issued_by'] = self.request.user.id
         serializer = PurchaseWriteSerializer(data=request.data)
@@ -178,14 +281,94 @@ class PurchaseViewsets(viewsets.ViewSet, PaginatorMixin):
         purchase = serializer.save()
         return Response(status=status.HTTP_200_OK, data=AppReadSerializer(instance=purchase.app).data)
 
+    @swagger_auto_schema(
+        operation_description="Purchase several apps in one transaction, results are reported per app",
+        request_body=BulkPurchaseSerializer,
+        responses={
+            status.HTTP_200_OK: BulkPurchaseResultSerializer(many=True),
+            status.HTTP_429_TOO_MANY_REQUESTS: CustomSchemes.error
+        },
+        manual_parameters=[CustomParameters.idempotency_key],
+        operation_id="bulk purchase apps"
+    )
+    @action(detail=False, methods=['post'])
+    @idempotent
+    def bulk(self, request):
+        serializer = BulkPurchaseSerializer(data=request.data, context={'issued_by_id': self.request.user.id})
+        serializer.is_valid(raise_exception=True)
+        return Response(status=status.HTTP_200_OK, data=serializer.save())
+
+    @swagger_auto_schema(
+        operation_description="Every purchase of the user with its app, streamed as NDJSON, one object per line, "
+                              "or CSV",
+        query_serializer=ExportQuerySerializer,
+        responses={
+            status.HTTP_200_OK: openapi.Response('NDJSON or CSV stream, rows ordered by id'),
+            status.HTTP_400_BAD_REQUEST: CustomSchemes.error
+        },
+        operation_id="export purchases"
+    )
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        qs = Purchase.objects.filter(issued_by=self.request.user.id)
+        return self.stream_export(qs, request, PurchaseListSerializer, 'purchases')
+
+
+class EntitlementViewsets(viewsets.ViewSet):
+    @swagger_auto_schema(
+        operation_description="Ids of every app the user owns",
+        responses={
+            status.HTTP_200_OK: EntitlementsSerializer
+        },
+        operation_id="entitlements"
+    )
+    def list(self, request):
+        return Response({'apps': sorted(entitlements.owned(self.request.user.id))})
+
+    @swagger_auto_schema(
+        operation_description="Which of the listed apps the user owns",
+        request_body=EntitlementCheckSerializer,
+        responses={
+            status.HTTP_200_OK: EntitlementCheckResultSerializer,
+            status.HTTP_400_BAD_REQUEST: CustomSchemes.error
+        },
+        operation_id="check entitlements"
+    )
+    @action(detail=False, methods=['post'])
+    def check(self, request):
+        serializer = EntitlementCheckSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        owned, not_owned = entitlements.check(self.request.user.id, serializer.validated_data['apps'])
+        return Response({'owned': sorted(owned), 'not_owned': sorted(not_owned)})
+
+
+class AccessVerifyView(APIView):
+    @swagger_auto_schema(
+        operation_description="For app backends, whether the user of the bearer token owns or bought the app "
+                              "of the access key",
+        request_body=AccessVerifySerializer,
+        responses={
+            status.HTTP_200_OK: AccessVerifyResultSerializer,
+            status.HTTP_400_BAD_REQUEST: CustomSchemes.error,
+            status.HTTP_401_UNAUTHORIZED: CustomSchemes.error
+        },
+        operation_id="verify access"
+    )
+    def post(self, request):
+        serializer = AccessVerifySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        allowed, app_id = access.verify(serializer.validated_data['access_key'], self.request.user.id)
+        return Response({'allowed': allowed, 'app': app_id})
+
 
 class Upload(APIView):
     parser_classes = [MultiPartParser, FormParser]
 
     @swagger_auto_schema(
-        operation_description="Upload an icon",
+        operation_description="Upload an icon, renditions are produced in the background while the status is pending. "
+                              "Identical files are stored once",
         responses={
-            status.HTTP_201_CREATED: UploadedIconSerializer,
+            status.HTTP_202_ACCEPTED: UploadedIconSerializer,
         },
         manual_parameters=[
             openapi.Parameter('file', openapi.IN_FORM, type=openapi.TYPE_FILE, description='Icon file to be uploaded'),
@@ -196,7 +379,70 @@ class Upload(APIView):
         request.data['user'] = self.request.user.id
         serializer = UploadedIconSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        icon = icons.store(serializer.validated_data['file'], self.request.user.id)
+
+        return Response(
+            data=UploadedIconSerializer(icon, context={'request': request}).data,
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+class UploadDetail(APIView):
+    @swagger_auto_schema(
+        operation_description="Status and renditions of an uploaded icon",
+        responses={
+            status.HTTP_200_OK: UploadedIconSerializer,
+            status.HTTP_404_NOT_FOUND: CustomSchemes.error
+        },
+        operation_id="uploaded icon"
+    )
+    def get(self, request, pk=None):
+        icon = get_object_or_404(UploadedIcon.objects.filter(user=self.request.user.id).select_related('blob'), pk=pk)
+        return Response(UploadedIconSerializer(icon, context={'request': request}).data)
+
+
+class AsyncAppViewsets(AsyncAPIViewMixin, AppViewsets):
+    @async_variant(AppViewsets.list)
+    @replica_reads
+    async def list(self, request):
+        qs = App.objects.filter(user=self.request.user.id)
+        return await self.apaginate(qs, request, AppListSerializer)
+
+    @async_variant(AppViewsets.retrieve)
+    @replica_reads
+    async def retrieve(self, request, pk=None):
+        app = await aget_object_or_404(App.objects.filter(user=self.request.user.id), pk=pk)
+        return Response(AppReadSerializer(app).data)
+
+    @async_variant(AppViewsets.export)
+    async def export(self, request):
+        qs = App.objects.filter(user=self.request.user.id)
+        return self.astream_export(qs, request, AppListSerializer, 'apps')
+
+
+class AsyncVerifiedAppsView(AsyncAPIViewMixin, VerifiedAppsView):
+    @async_variant(VerifiedAppsView.get)
+    @replica_reads
+    async def get(self, request, *args, **kwargs):
+        # pages come from the catalogue cache, which has no async backend to await
+        return await sync_to_async(self.list)(request, *args, **kwargs)
+
+
+class AsyncPurchaseViewsets(AsyncAPIViewMixin, PurchaseViewsets):
+    @async_variant(PurchaseViewsets.list)
+    @replica_reads
+    async def list(self, request):
+        qs = Purchase.objects.filter(issued_by=self.request.user.id)
+        return await self.apaginate(qs, request, PurchaseListSerializer)
 
-        return Response(data=serializer.data, status=status.HTTP_201_CREATED)
+    @async_variant(PurchaseViewsets.retrieve)
+    @replica_reads
+    async def retrieve(self, request, pk=None):
+        qs = Purchase.objects.filter(issued_by=self.request.user.id).select_related('app')
+        purchase = await aget_object_or_404(qs, pk=pk)
+        return Response(PurchaseReadSerializer(purchase).data)
 
+    @async_variant(PurchaseViewsets.export)
+    async def export(self, request):
+        qs = Purchase.objects.filter(issued_by=self.request.user.id)
+        return self.astream_export(qs, request, PurchaseListSerializer, 'purchases')
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'appstore.settings')
+# route the hot read endpoints to their async views, see ASYNC_VIEWS
+os.environ.setdefault('ASGI', 'yes')
 
 application = get_asgi_application()
@@ -0,0 +1,92 @@
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.http import Http404
+from django.utils.decorators import classonlymethod
+from rest_framework import exceptions
+
+
+def async_variant(method):
+    """Marks the coroutine as the async variant of ``method``, keeping its name, docstring and swagger schema"""
+
+    def decorator(coroutine):
+        return wraps(method)(coroutine)
+
+    return decorator
+
+
+async def aget_object_or_404(qs, **kwargs):
+    try:
+        return await qs.aget(**kwargs)
+    except qs.model.DoesNotExist:
+        raise Http404(f'No {qs.model._meta.object_name} matches the given query.')
+
+
+class AsyncAPIViewMixin:
+    """
+    Dispatches a DRF view or viewset on the event loop.
+
+    Handlers written with ``async def`` are awaited, the synchronous handlers of the same view run in
+    a thread the way Django runs synchronous views under ASGI. Authenticators providing ``aauthenticate``
+    are awaited as well. Permission classes are checked on the event loop, so they must not query.
+    """
+
+    view_is_async = True
+
+    @classonlymethod
+    def as_view(cls, *args, **kwargs):
+        return markcoroutinefunction(super().as_view(*args, **kwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                response = await sync_to_async(handler)(request, *args, **kwargs)
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def ainitial(self, request, *args, **kwargs):
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+
+        request.accepted_renderer, request.accepted_media_type = self.perform_content_negotiation(request)
+        request.version, request.versioning_scheme = self.determine_version(request, *args, **kwargs)
+
+        await self.aperform_authentication(request)
+        self.check_permissions(request)
+        if self.get_throttles():
+            await sync_to_async(self.check_throttles)(request)
+
+    async def aperform_authentication(self, request):
+        for authenticator in request.authenticators:
+            try:
+                if hasattr(authenticator, 'aauthenticate'):
+                    user_auth_tuple = await authenticator.aauthenticate(request)
+                else:
+                    user_auth_tuple = await sync_to_async(authenticator.authenticate)(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+
+        request._not_authenticated()
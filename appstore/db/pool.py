@@ -0,0 +1,138 @@
+import threading
+import time
+
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Thread safe pool of at most ``size`` connections opened with ``connect``.
+
+    Connections are opened on demand and handed out most recently used first. Once every connection
+    is checked out, acquire() waits up to ``timeout`` seconds for one to come back. ``reset`` runs when
+    a connection is released, ``check`` before an idle one is handed out again, a connection failing
+    either, or older than ``max_lifetime`` seconds, is closed and replaced.
+    """
+
+    def __init__(self, connect, size, max_lifetime=None, timeout=None, check=None, reset=None):
+        self.connect = connect
+        self.size = size
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.check = check
+        self.reset = reset
+
+        self.condition = threading.Condition()
+        self.idle = deque()
+        # monotonic open time of every connection, checked out or idle
+        self.opened_at = {}
+        self.opening = 0
+
+    def expired(self, connection):
+        if getattr(connection, 'closed', False):
+            return True
+        opened_at = self.opened_at.get(id(connection))
+        return self.max_lifetime is not None and time.monotonic() - opened_at >= self.max_lifetime
+
+    def acquire(self):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+
+        while True:
+            with self.condition:
+                while not self.idle and len(self.opened_at) + self.opening >= self.size:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise PoolTimeout(f'No connection came back to the pool within {self.timeout}s')
+                    self.condition.wait(remaining)
+
+                if self.idle:
+                    connection = self.idle.pop()
+                else:
+                    self.opening += 1
+                    connection = None
+
+            if connection is None:
+                return self.open()
+            if self.expired(connection) or (self.check is not None and not self.check(connection)):
+                self.discard(connection)
+                continue
+            return connection
+
+    def open(self):
+        try:
+            connection = self.connect()
+        except BaseException:
+            with self.condition:
+                self.opening -= 1
+                self.condition.notify()
+            raise
+
+        with self.condition:
+            self.opening -= 1
+            self.opened_at[id(connection)] = time.monotonic()
+        return connection
+
+    def release(self, connection):
+        if id(connection) not in self.opened_at:
+            connection.close()
+            return
+
+        try:
+            if self.reset is not None:
+                self.reset(connection)
+        except Exception:
+            self.discard(connection)
+            return
+
+        if self.expired(connection):
+            self.discard(connection)
+            return
+
+        with self.condition:
+            self.idle.append(connection)
+            self.condition.notify()
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+        with self.condition:
+            self.opened_at.pop(id(connection), None)
+            self.condition.notify()
+
+    def close(self):
+        """Closes the idle connections, the checked out ones are closed when they are released"""
+
+        with self.condition:
+            idle, self.idle = list(self.idle), deque()
+        for connection in idle:
+            self.discard(connection)
+        with self.condition:
+            self.max_lifetime = 0
+
+    def stats(self):
+        with self.condition:
+            return {
+                'size': self.size,
+                'open': len(self.opened_at),
+                'idle': len(self.idle),
+            }
+
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(key, factory):
+    """Pool shared by every thread of the process under ``key``, built with ``factory`` the first time"""
+
+    with pools_lock:
+        if key not in pools:
+            pools[key] = factory()
+        return pools[key]
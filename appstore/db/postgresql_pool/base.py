@@ -0,0 +1,63 @@
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.base import Database, IsolationLevel
+from appstore.db.pool import ConnectionPool, PoolTimeout, get_pool
+
+
+def rollback(connection):
+    # connections go back idle and in autocommit, the next wrapper sets its own autocommit mode
+    if connection.get_transaction_status() != Database.extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+
+
+def is_usable(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        # outside autocommit the ping opened a transaction, the borrower gets the connection idle
+        rollback(connection)
+    except Database.Error:
+        return False
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL backend borrowing its connections from a pool shared by the threads of the process.
+
+    Closing the connection, after every request as CONN_MAX_AGE is 0, hands it back to the pool instead.
+    The pool is configured by the ``POOL`` dict of the database settings: ``SIZE``, ``MAX_LIFETIME``
+    and ``TIMEOUT`` in seconds.
+    """
+
+    def get_pool(self):
+        def factory():
+            conn_params = self.get_connection_params()
+            options = self.settings_dict.get('POOL', {})
+            return ConnectionPool(
+                lambda: base.DatabaseWrapper.get_new_connection(self, conn_params),
+                size=options.get('SIZE', 10),
+                max_lifetime=options.get('MAX_LIFETIME'),
+                timeout=options.get('TIMEOUT'),
+                check=is_usable if self.settings_dict['CONN_HEALTH_CHECKS'] else None,
+                reset=rollback,
+            )
+
+        # the test runner renames the database of an alias, its connections must not be handed out anymore
+        key = (self.alias, *(self.settings_dict[name] for name in ('NAME', 'USER', 'HOST', 'PORT')))
+        return get_pool(key, factory)
+
+    def get_new_connection(self, conn_params):
+        try:
+            connection = self.get_pool().acquire()
+        except PoolTimeout as e:
+            raise Database.OperationalError(str(e)) from e
+
+        self.isolation_level = IsolationLevel(
+            self.settings_dict['OPTIONS'].get('isolation_level', IsolationLevel.READ_COMMITTED)
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.get_pool().release(self.connection)
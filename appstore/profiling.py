@@ -0,0 +1,259 @@
+import json
+import logging
+import random
+import re
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.request import Request
+from rest_framework.serializers import BaseSerializer
+from appstore.async_views import AsyncAPIViewMixin
+
+logger = logging.getLogger(__name__)
+
+# upper bounds of the latency buckets in milliseconds, the last one catches everything slower
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf'))
+
+PLACEHOLDER_LIST = re.compile(r'\((?:%s, )+%s\)')
+ROUTE_GROUP = re.compile(r'\(\?P<(\w+)>[^)]*\)')
+
+_current = ContextVar('profile', default=None)
+_histograms = {}
+_histograms_lock = threading.Lock()
+_installed = False
+
+
+class Profile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_time = 0
+        self.serializer_time = 0
+        self.auth_time = 0
+        self.depth = 0
+        self.queries = Counter()
+
+    @property
+    def duplicates(self):
+        return {sql: count for sql, count in self.queries.most_common(5) if count > 1}
+
+    def timings(self):
+        return {
+            'total': (time.perf_counter() - self.started) * 1000,
+            'db': self.sql_time * 1000,
+            'serializer': self.serializer_time * 1000,
+            'auth': self.auth_time * 1000,
+        }
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.totals = Counter()
+        self.max = 0
+
+    def add(self, timings, queries):
+        self.buckets[bisect_left(BUCKETS, timings['total'])] += 1
+        self.count += 1
+        self.totals.update({f'{key}_ms': value for key, value in timings.items()})
+        self.totals['queries'] += queries
+        self.max = max(self.max, timings['total'])
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the percentile, exact values are not kept"""
+
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= fraction * self.count:
+                return bound if bound != float('inf') else round(self.max, 3)
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'p50_ms': self.percentile(.5),
+            'p95_ms': self.percentile(.95),
+            'p99_ms': self.percentile(.99),
+            'max_ms': round(self.max, 3),
+            **{f'mean_{key}': round(value / self.count, 3) for key, value in sorted(self.totals.items())},
+        }
+
+
+def fingerprint(sql):
+    return PLACEHOLDER_LIST.sub('(...)', sql)
+
+
+def endpoint(request):
+    """``GET /api/apps/<pk>/`` for both path() and the router's regex patterns"""
+
+    match = request.resolver_match
+    if match is None:
+        return f'{request.method} <unresolved>'
+
+    route = ROUTE_GROUP.sub(r'<\1>', match.route).replace('^', '').replace('$', '')
+    return f'{request.method} /{route}'
+
+
+def record_query(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.sql_time += time.perf_counter() - started
+        profile.queries[fingerprint(sql)] += 1
+
+
+def add_wrapper(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def timed(func, attribute):
+    """Adds the runtime of ``func`` to ``attribute`` of the current profile, nested calls are counted once"""
+
+    if iscoroutinefunction(func):
+        async def awrapper(*args, **kwargs):
+            profile = _current.get()
+            if profile is None or profile.depth:
+                return await func(*args, **kwargs)
+
+            profile.depth += 1
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                setattr(profile, attribute, getattr(profile, attribute) + time.perf_counter() - started)
+                profile.depth -= 1
+
+        return awrapper
+
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None or profile.depth:
+            return func(*args, **kwargs)
+
+        profile.depth += 1
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            setattr(profile, attribute, getattr(profile, attribute) + time.perf_counter() - started)
+            profile.depth -= 1
+
+    return wrapper
+
+
+def install():
+    global _installed
+
+    if _installed:
+        return
+    _installed = True
+
+    connection_created.connect(add_wrapper)
+    for connection in connections.all(initialized_only=True):
+        add_wrapper(None, connection)
+    BaseSerializer.data = property(timed(BaseSerializer.data.fget, 'serializer_time'))
+    Request._authenticate = timed(Request._authenticate, 'auth_time')
+    AsyncAPIViewMixin.aperform_authentication = timed(AsyncAPIViewMixin.aperform_authentication, 'auth_time')
+
+
+def stats():
+    """Per endpoint histograms of this process, slowest p95 first"""
+
+    with _histograms_lock:
+        report = {endpoint: histogram.as_dict() for endpoint, histogram in _histograms.items()}
+
+    return dict(sorted(report.items(), key=lambda item: (-item[1]['p95_ms'], item[0])))
+
+
+def reset():
+    with _histograms_lock:
+        _histograms.clear()
+
+
+class ProfilingMiddleware:
+    """
+    Records SQL, serializer and authentication time of a sample of the requests.
+    Enabled with PROFILING, PROFILING_SAMPLE_RATE is the share of requests that are measured.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING:
+            raise MiddlewareNotUsed()
+
+        install()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+
+        profile = Profile()
+        token = _current.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        self.report(request, response, profile)
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        profile = Profile()
+        token = _current.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        self.report(request, response, profile)
+        return response
+
+    def report(self, request, response, profile):
+        timings = profile.timings()
+        queries = sum(profile.queries.values())
+        name = endpoint(request)
+
+        with _histograms_lock:
+            _histograms.setdefault(name, Histogram()).add(timings, queries)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timings["db"]:.3f};desc="{queries} queries"',
+            f'serializer;dur={timings["serializer"]:.3f}',
+            f'auth;dur={timings["auth"]:.3f}',
+            f'total;dur={timings["total"]:.3f}',
+        ])
+
+        level = logging.WARNING if timings['total'] >= settings.PROFILING_SLOW_MS else logging.INFO
+        logger.log(level, json.dumps({
+            'endpoint': name,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': queries,
+            'duplicates': profile.duplicates,
+            **{f'{key}_ms': round(value, 3) for key, value in timings.items()},
+        }))
@@ -0,0 +1,159 @@
+import csv
+
+from io import StringIO
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer encoding with orjson when it is installed and JSON_BACKEND is ``orjson``.
+    Types orjson leaves alone, datetimes included, go through DRF's encoder so the output matches,
+    indented output and the non compact or ASCII settings fall back to the stdlib encoder.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            data is None or orjson is None or settings.JSON_BACKEND != 'orjson'
+            or not self.compact or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(
+            data, default=self.encoder_class().default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        )
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class JSONArrayEncoder:
+    """Streams the rows as the items of one JSON array"""
+
+    content_type = 'application/json'
+    extension = 'json'
+
+    def __init__(self, serializer_class):
+        self.renderer = FastJSONRenderer()
+        self.separator = b''
+
+    def header(self):
+        return b'['
+
+    def encode(self, rows):
+        # drop the brackets of the encoded list, the rows are joined into the streamed array
+        chunk = self.separator + self.renderer.render(rows)[1:-1]
+        self.separator = b','
+        return chunk
+
+    def footer(self):
+        return b']'
+
+
+class NDJSONEncoder:
+    content_type = 'application/x-ndjson'
+    extension = 'ndjson'
+
+    def __init__(self, serializer_class):
+        self.renderer = FastJSONRenderer()
+
+    def header(self):
+        return b''
+
+    def encode(self, rows):
+        return b''.join(self.renderer.render(row) + b'\n' for row in rows)
+
+    def footer(self):
+        return b''
+
+
+class CSVEncoder:
+    """Nested objects are flattened into ``app.title`` like columns, named after the serializer columns"""
+
+    content_type = 'text/csv'
+    extension = 'csv'
+
+    def __init__(self, serializer_class):
+        self.fieldnames = [column.replace('__', '.') for column in serializer_class.columns]
+
+    def write(self, rows):
+        buffer = StringIO()
+        writer = csv.DictWriter(buffer, self.fieldnames, extrasaction='ignore')
+        if rows is None:
+            writer.writeheader()
+        else:
+            writer.writerows(flatten(row) for row in rows)
+        return buffer.getvalue().encode()
+
+    def header(self):
+        return self.write(None)
+
+    def encode(self, rows):
+        return self.write(rows)
+
+    def footer(self):
+        return b''
+
+
+ENCODERS = {
+    'json': JSONArrayEncoder,
+    'ndjson': NDJSONEncoder,
+    'csv': CSVEncoder,
+}
+
+
+def flatten(row, prefix=''):
+    flat = {}
+    for key, value in row.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{key}.'))
+        else:
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def achunked(rows, size):
+    chunk = []
+    async for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_rows(qs, serializer_class, context, chunk_size, encoder_class=JSONArrayEncoder):
+    """Encodes ``qs`` read from a server side cursor ``chunk_size`` rows at a time"""
+
+    encoder = encoder_class(serializer_class)
+
+    yield encoder.header()
+    for chunk in chunked(qs.iterator(chunk_size=chunk_size), chunk_size):
+        yield encoder.encode(serializer_class(chunk, many=True, context=context).data)
+    yield encoder.footer()
+
+
+async def astream_rows(qs, serializer_class, context, chunk_size, encoder_class=JSONArrayEncoder):
+    encoder = encoder_class(serializer_class)
+
+    yield encoder.header()
+    async for chunk in achunked(qs.aiterator(chunk_size=chunk_size), chunk_size):
+        yield encoder.encode(serializer_class(chunk, many=True, context=context).data)
+    yield encoder.footer()
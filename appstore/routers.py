@@ -0,0 +1,148 @@
+import random
+
+from contextvars import ContextVar
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+
+CACHE_ALIAS = 'replica_pins'
+
+# Money and replay state, a lagging copy of them could double spend
+PRIMARY_ONLY = {'core.wallet', 'core.walletshard', 'core.ledgerentry', 'core.idempotencykey'}
+
+# a pin only this process sees sends the next request of the user, served by another worker, to a replica
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+
+class RoutingState:
+    def __init__(self):
+        self.replica = False
+        self.wrote = False
+
+
+# Mutated rather than set again, so writes made in sync_to_async threads are seen by the middleware
+state = ContextVar('routing_state', default=None)
+
+
+def pin_key(user_id):
+    return f'primary:{user_id}'
+
+
+def is_pinned(user_id):
+    return caches[CACHE_ALIAS].get(pin_key(user_id)) is not None
+
+
+def pin(user_id):
+    caches[CACHE_ALIAS].set(pin_key(user_id), 1, timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def replica_reads(view_method):
+    """
+    Serves the reads of a handler from the replicas, unless the user wrote within REPLICA_PIN_SECONDS.
+    Only for handlers which don't write and can show data a replication lag old.
+    """
+
+    def use_replica(request):
+        current = state.get()
+        if current is not None and not is_pinned(request.user.id):
+            current.replica = True
+        return current
+
+    if iscoroutinefunction(view_method):
+        @wraps(view_method)
+        async def wrapper(self, request, *args, **kwargs):
+            current = use_replica(request)
+            try:
+                return await view_method(self, request, *args, **kwargs)
+            finally:
+                if current is not None:
+                    current.replica = False
+    else:
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            current = use_replica(request)
+            try:
+                return view_method(self, request, *args, **kwargs)
+            finally:
+                if current is not None:
+                    current.replica = False
+
+    return wrapper
+
+
+class ReplicaRouter:
+    """
+    Reads of the handlers decorated with replica_reads go to a random DATABASE_REPLICAS alias, everything
+    else, the write handlers with PurchaseWriteSerializer included, stays on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        current = state.get()
+        if current is None or not current.replica or current.wrote or model._meta.label_lower in PRIMARY_ONLY:
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        current = state.get()
+        if current is not None:
+            current.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    """Tracks the database use of each request and pins its user to the primary once it wrote"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed()
+        if isinstance(caches[CACHE_ALIAS], PROCESS_LOCAL_CACHES):
+            raise ImproperlyConfigured(
+                f'DATABASE_REPLICAS need a {CACHE_ALIAS!r} cache shared between the workers, '
+                'set REPLICA_PIN_CACHE_BACKEND'
+            )
+
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        current = RoutingState()
+        token = state.set(current)
+        try:
+            response = self.get_response(request)
+        finally:
+            state.reset(token)
+
+        self.pin_writer(request, current)
+        return response
+
+    async def __acall__(self, request):
+        current = RoutingState()
+        token = state.set(current)
+        try:
+            response = await self.get_response(request)
+        finally:
+            state.reset(token)
+
+        self.pin_writer(request, current)
+        return response
+
+    def pin_writer(self, request, current):
+        user = getattr(request, 'user', None)
+        if current.wrote and user is not None and user.is_authenticated:
+            pin(user.id)
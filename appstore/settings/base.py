@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 from datetime import timedelta
 from pathlib import Path
@@ -40,6 +41,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'appstore.profiling.ProfilingMiddleware',
+    'appstore.routers.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'appstore.urls'
@@ -81,6 +84,28 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# hasher of new passwords, pbkdf2_sha256 or scrypt, hashes made by the other or with another cost are updated on login
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'pbkdf2_sha256')
+# cost of the hashers, the defaults of Django 4.2
+PASSWORD_HASH_ITERATIONS = int(os.getenv('PASSWORD_HASH_ITERATIONS', 600000))
+PASSWORD_SCRYPT_WORK_FACTOR = int(os.getenv('PASSWORD_SCRYPT_WORK_FACTOR', 2 ** 14))
+# threads hashing passwords per process, 0 hashes in the request thread
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+
+CONFIGURABLE_HASHERS = {
+    'pbkdf2_sha256': 'apps.authenticate.hashers.PBKDF2PasswordHasher',
+    'scrypt': 'apps.authenticate.hashers.ScryptPasswordHasher',
+}
+PASSWORD_HASHERS = [CONFIGURABLE_HASHERS[PASSWORD_HASHER]] + [
+    path for name, path in CONFIGURABLE_HASHERS.items() if name != PASSWORD_HASHER
+] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+AUTHENTICATION_BACKENDS = ['apps.authenticate.backends.ModelBackend']
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -88,6 +113,93 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # pre-serialized pages of /api/apps/verified/. Saving an app sets a new version in it, every worker has to
+    # see it: the files are shared by the workers of a host, use memcached or redis when they span hosts.
+    # A per-process LocMemCache keeps serving the old pages on the other workers for CATALOGUE_CACHE_TIMEOUT
+    'catalogue': {
+        'BACKEND': os.getenv('CATALOGUE_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CATALOGUE_CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'appstore-catalogue')),
+        'TIMEOUT': int(os.getenv('CATALOGUE_CACHE_TIMEOUT', 300)),
+    },
+    # ids of the apps each user bought, see apps.core.entitlements. A purchase sets a new version of its buyer,
+    # every worker has to see it: the files are shared by the workers of a host, use memcached or redis when
+    # they span hosts. A per-process LocMemCache denies the buyer on the other workers for ENTITLEMENTS_CACHE_TIMEOUT
+    'entitlements': {
+        'BACKEND': os.getenv('ENTITLEMENTS_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv(
+            'ENTITLEMENTS_CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'appstore-entitlements')
+        ),
+        'TIMEOUT': int(os.getenv('ENTITLEMENTS_CACHE_TIMEOUT', 300)),
+    },
+    # active and staff flags of the authenticated users, see apps.authenticate.authentication.UserFlagsCache.
+    # Use a cache shared between workers, deactivations reach the other workers only within USER_FLAGS_TTL otherwise
+    'user_flags': {
+        'BACKEND': os.getenv('USER_FLAGS_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('USER_FLAGS_CACHE_LOCATION', 'user_flags'),
+    },
+    # version of the token blacklist, see apps.authenticate.tokens.BlacklistFilter. Use a cache shared between
+    # workers, a logout is accepted by the other workers within TOKEN_BLACKLIST_SYNC_INTERVAL otherwise
+    'token_blacklist': {
+        'BACKEND': os.getenv('TOKEN_BLACKLIST_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('TOKEN_BLACKLIST_CACHE_LOCATION', 'token_blacklist'),
+    },
+    # users who wrote recently, they read from the primary. Every worker must see the pins, the files are
+    # shared by the workers of a host, use memcached or redis when they span hosts. appstore.routers refuses
+    # a per-process cache while DATABASE_REPLICAS are configured
+    'replica_pins': {
+        'BACKEND': os.getenv('REPLICA_PIN_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv(
+            'REPLICA_PIN_CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'appstore-replica-pins')
+        ),
+    },
+}
+
+# aliases of the read replicas, filled by the environment settings, see appstore.routers
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['appstore.routers.ReplicaRouter']
+# seconds a user reads from the primary after writing
+REPLICA_PIN_SECONDS = float(os.getenv('REPLICA_PIN_SECONDS', 5))
+
+# requests are authenticated with the token claims and cached user flags instead of the User row,
+# see apps.authenticate.authentication
+AUTH_TOKEN_CLAIMS = os.getenv('AUTH_TOKEN_CLAIMS', 'yes').lower() == 'yes'
+# seconds the active and staff flags of a user are cached, how long a worker not sharing the user_flags cache
+# keeps accepting a deactivated user or a revoked staff flag
+USER_FLAGS_TTL = float(os.getenv('USER_FLAGS_TTL', 5))
+
+# number of rows seller credits are spread over, see apps.core.ledger
+WALLET_SHARDS = int(os.getenv('WALLET_SHARDS', 8))
+
+# seconds a recorded Idempotency-Key response is replayed for
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+# per-process Bloom filter in front of the token blacklist, see apps.authenticate.tokens
+TOKEN_BLACKLIST_FILTER_CAPACITY = int(os.getenv('TOKEN_BLACKLIST_FILTER_CAPACITY', 100000))
+TOKEN_BLACKLIST_FILTER_ERROR_RATE = float(os.getenv('TOKEN_BLACKLIST_FILTER_ERROR_RATE', 0.001))
+# seconds between the syncs of the filter, how long a worker not sharing the token_blacklist cache keeps
+# refreshing a token blacklisted by another worker
+TOKEN_BLACKLIST_SYNC_INTERVAL = float(os.getenv('TOKEN_BLACKLIST_SYNC_INTERVAL', 5))
+
+# per-process index behind /api/access/verify/, see apps.core.access
+ACCESS_INDEX_SYNC_INTERVAL = float(os.getenv('ACCESS_INDEX_SYNC_INTERVAL', 5))
+ACCESS_INDEX_RELOAD_INTERVAL = float(os.getenv('ACCESS_INDEX_RELOAD_INTERVAL', 600))
+
+
+# token buckets of the throttled endpoints, a SQLite file shared by the workers of the host
+THROTTLE_STORE = os.getenv('THROTTLE_STORE', os.path.join(tempfile.gettempdir(), 'appstore-throttle.sqlite3'))
+# requests per second, min, hour or day of each throttle scope, empty to disable one
+THROTTLE_RATES = {
+    'login': os.getenv('THROTTLE_LOGIN_RATE', '10/min') or None,
+    'register': os.getenv('THROTTLE_REGISTER_RATE', '5/min') or None,
+    'purchase': os.getenv('THROTTLE_PURCHASE_RATE', '60/min') or None,
+}
+# proxies in front of the workers, the client address is then read from X-Forwarded-For
+THROTTLE_NUM_PROXIES = int(os.getenv('THROTTLE_NUM_PROXIES')) if os.getenv('THROTTLE_NUM_PROXIES') else None
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -110,6 +222,30 @@ STATIC_ROOT = 'static'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = 'media'
 
+# uploads are hashed while they stream in, see apps.core.uploads
+FILE_UPLOAD_HANDLERS = [
+    'apps.core.uploads.HashingMemoryFileUploadHandler',
+    'apps.core.uploads.HashingTemporaryFileUploadHandler',
+]
+
+# threads rendering uploaded icons, 0 renders them inline after the upload commits
+ICON_WORKERS = int(os.getenv('ICON_WORKERS', 2))
+ICON_RENDITION_SIZES = (512, 256, 128, 64)
+
+# serve the hot read endpoints with async views, set by appstore.asgi and gunicorn.conf.py
+ASYNC_VIEWS = os.getenv('ASGI', '').lower() == 'yes'
+
+# orjson encodes the responses when it is installed, json forces the stdlib encoder
+JSON_BACKEND = os.getenv('JSON_BACKEND', 'orjson')
+
+# rows read per round trip by ?pagination=stream
+STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', 500))
+
+# per request SQL, serializer and auth timings, see appstore.profiling
+PROFILING = os.getenv('PROFILING', '').lower() == 'yes'
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 1))
+PROFILING_SLOW_MS = float(os.getenv('PROFILING_SLOW_MS', 500))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -132,18 +268,29 @@ if os.environ.get('PRODUCTION', '').lower() == 'yes':
 else:
     from appstore.settings.development import *
 
+    # a second SQLite file standing in for a read replica, the test runner mirrors it to the test database
+    if os.getenv('LITE_DB_REPLICA'):
+        DATABASES['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('LITE_DB_REPLICA'),
+            'TEST': {'MIRROR': 'default'},
+        }
+        DATABASE_REPLICAS = ['replica']
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.authenticate.authentication.ClaimsJWTAuthentication' if AUTH_TOKEN_CLAIMS
+        else 'apps.authenticate.authentication.JWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': ('rest_framework.permissions.IsAuthenticated',),
     'PAGE_SIZE': PAGE_SIZE,
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'DEFAULT_RENDERER_CLASSES': ('rest_framework.renderers.JSONRenderer',),
+    'DEFAULT_RENDERER_CLASSES': ('appstore.renderers.FastJSONRenderer',),
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.ScopedRateThrottle',
+        'appstore.throttling.TokenBucketThrottle',
     ],
-    'DEFAULT_THROTTLE_RATES': {}
+    'DEFAULT_THROTTLE_RATES': THROTTLE_RATES,
+    'NUM_PROXIES': THROTTLE_NUM_PROXIES,
 }
 
 
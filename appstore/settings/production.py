@@ -21,21 +21,42 @@ LOGGING = {
             "level": "INFO",
             "propagate": True,
         },
+        "appstore.profiling": {
+            "handlers": ["file"],
+            "level": "INFO",
+        },
     },
 }
 
 
+# DB_POOL=Yes hands the connections of a process out of a pool shared by its threads, they go back
+# to it after every request. Otherwise each thread keeps its connection for DB_CONN_MAX_AGE seconds
+DB_POOL = os.getenv('DB_POOL', '').lower() == 'yes'
+
 DATABASES = {
     'default': {
-        "ENGINE": "django.db.backends.postgresql",
+        "ENGINE": "appstore.db.postgresql_pool" if DB_POOL else "django.db.backends.postgresql",
         "HOST": os.getenv('DB_HOST'),
         "USER": os.getenv('DB_USER'),
         "NAME": os.getenv('DB_NAME'),
         "PASSWORD": os.getenv('DB_PASS'),
         "PORT": int(os.getenv('DB_PORT')),
+        "CONN_MAX_AGE": 0 if DB_POOL else int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        "CONN_HEALTH_CHECKS": os.getenv('DB_CONN_HEALTH_CHECKS', 'yes').lower() == 'yes',
+        "POOL": {
+            "SIZE": int(os.getenv('DB_POOL_SIZE', 10)),
+            "MAX_LIFETIME": float(os.getenv('DB_POOL_MAX_LIFETIME', 30 * 60)),
+            "TIMEOUT": float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        },
     }
 }
 
+# comma separated hosts of streaming replicas of the database, same credentials as the primary
+DATABASE_REPLICAS = []
+for index, host in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(','))):
+    DATABASES[f'replica_{index}'] = {**DATABASES['default'], 'HOST': host.strip(), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica_{index}')
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000"
 ]
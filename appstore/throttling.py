@@ -0,0 +1,123 @@
+import time
+import sqlite3
+import threading
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import ScopedRateThrottle
+
+
+# DRF rates are per second, minute, hour or day, an untouched bucket is full again within a day
+IDLE_SECONDS = 24 * 60 * 60
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    allowed INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID
+'''
+
+# refill since the last request, capped at the capacity, then take a token when a whole one is left
+TAKE = '''
+INSERT INTO buckets (key, tokens, allowed, updated_at) VALUES (:key, :capacity - 1, 1, :now)
+ON CONFLICT (key) DO UPDATE SET
+    allowed = min(:capacity, tokens + max(:now - updated_at, 0) * :rate) >= 1,
+    tokens = min(:capacity, tokens + max(:now - updated_at, 0) * :rate)
+        - (min(:capacity, tokens + max(:now - updated_at, 0) * :rate) >= 1),
+    updated_at = :now
+RETURNING allowed, tokens
+'''
+
+
+class TokenBucketStore:
+    """
+    Token buckets in a SQLite file shared by the workers of a host, each request is a single UPSERT on
+    a local file rather than a round trip to the database or a cache server.
+    """
+
+    PRUNE_INTERVAL = 60
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.pruned_at = time.time()
+
+    def get_connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(SCHEMA)
+            self.local.connection = connection
+        return connection
+
+    def take(self, key, capacity, rate):
+        """Takes a token out of the bucket of ``key``, returns whether it was allowed and the seconds to wait"""
+
+        now = time.time()
+        params = {'key': key, 'capacity': capacity, 'rate': rate, 'now': now}
+        allowed, tokens = self.get_connection().execute(TAKE, params).fetchone()
+
+        if now - self.pruned_at >= self.PRUNE_INTERVAL:
+            self.pruned_at = now
+            self.prune(now)
+
+        return bool(allowed), 0 if allowed else (1 - tokens) / rate
+
+    def prune(self, now=None):
+        # a bucket idle for a day is full, the same as no row at all
+        now = time.time() if now is None else now
+        self.get_connection().execute('DELETE FROM buckets WHERE updated_at < ?', (now - IDLE_SECONDS,))
+
+    def clear(self):
+        self.get_connection().execute('DELETE FROM buckets')
+
+
+stores = {}
+stores_lock = threading.Lock()
+
+
+def get_store():
+    with stores_lock:
+        if settings.THROTTLE_STORE not in stores:
+            stores[settings.THROTTLE_STORE] = TokenBucketStore(settings.THROTTLE_STORE)
+        return stores[settings.THROTTLE_STORE]
+
+
+class TokenBucketThrottle(ScopedRateThrottle):
+    """
+    ScopedRateThrottle with a token bucket per scope and user, or client address for anonymous requests,
+    in the TokenBucketStore at THROTTLE_STORE. A rate of ``10/min`` allows bursts of 10 requests and
+    refills a token every 6 seconds, a scope without a rate is not throttled.
+    """
+
+    @property
+    def THROTTLE_RATES(self):
+        # read on every request, unlike the class attribute of DRF, so overridden settings apply
+        return api_settings.DEFAULT_THROTTLE_RATES
+
+    def get_rate(self):
+        return self.THROTTLE_RATES.get(self.scope)
+
+    def allow_request(self, request, view):
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        allowed, self.wait_seconds = get_store().take(self.key, self.num_requests, self.num_requests / self.duration)
+        return allowed
+
+    def wait(self):
+        return self.wait_seconds
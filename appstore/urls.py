@@ -21,7 +21,7 @@ from django.conf.urls.static import static
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
-from apps.core.views import Upload
+from apps.core.views import Upload, UploadDetail
 
 schema_view = get_schema_view(
    openapi.Info(
@@ -39,6 +39,7 @@ urlpatterns = [
     path('api/', include('apps.core.urls')),
     path('auth/', include('apps.authenticate.urls')),
     path('upload/', Upload.as_view()),
+    path('upload/<int:pk>/', UploadDetail.as_view()),
 ]
 
 
@@ -1,6 +1,11 @@
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from rest_framework.pagination import PageNumberPagination
+from django.core.paginator import InvalidPage
+from django.http import StreamingHttpResponse
+from rest_framework import serializers
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 from drf_yasg import openapi
+from appstore.renderers import ENCODERS, stream_rows, astream_rows
 
 
 class CustomSchemes:
@@ -29,11 +34,179 @@ class CustomSchemes:
         }
     )
 
+    cache_stats = openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            "hits": openapi.Schema(type=openapi.TYPE_INTEGER),
+            "misses": openapi.Schema(type=openapi.TYPE_INTEGER),
+            "hit_ratio": openapi.Schema(type=openapi.TYPE_NUMBER, x_nullable=True),
+        }
+    )
+
+    endpoint_stats = openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            "count": openapi.Schema(type=openapi.TYPE_INTEGER),
+            "p50_ms": openapi.Schema(type=openapi.TYPE_NUMBER),
+            "p95_ms": openapi.Schema(type=openapi.TYPE_NUMBER),
+            "p99_ms": openapi.Schema(type=openapi.TYPE_NUMBER),
+            "max_ms": openapi.Schema(type=openapi.TYPE_NUMBER),
+            "mean_total_ms": openapi.Schema(type=openapi.TYPE_NUMBER),
+            "mean_db_ms": openapi.Schema(type=openapi.TYPE_NUMBER),
+            "mean_serializer_ms": openapi.Schema(type=openapi.TYPE_NUMBER),
+            "mean_auth_ms": openapi.Schema(type=openapi.TYPE_NUMBER),
+            "mean_queries": openapi.Schema(type=openapi.TYPE_NUMBER),
+        }
+    )
+
+    stats = openapi.Schema(
+        type=openapi.TYPE_OBJECT,
+        properties={
+            "catalogue": cache_stats,
+            "requests": openapi.Schema(type=openapi.TYPE_OBJECT, additional_properties=endpoint_stats),
+        }
+    )
+
+
+class CustomParameters:
+    page = openapi.Parameter(
+        'page', openapi.IN_QUERY, type='int', description='Number of page, ignored in cursor mode', required=False
+    )
+
+    pagination = openapi.Parameter(
+        'pagination', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['page', 'cursor', 'stream'], required=False,
+        description='`cursor` switches to keyset pagination: no count, opaque next/previous cursors, ordered by id. '
+                    '`stream` answers with a plain JSON array of every result, streamed as it is read'
+    )
+
+    cursor = openapi.Parameter(
+        'cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING, required=False,
+        description='Opaque cursor taken from the next/previous links in cursor mode'
+    )
+
+    paginated = [page, pagination, cursor]
+
+    idempotency_key = openapi.Parameter(
+        'Idempotency-Key', openapi.IN_HEADER, type=openapi.TYPE_STRING, required=False,
+        description='Retries carrying the same key replay the first response instead of purchasing again'
+    )
+
+
+class KeysetPagination(CursorPagination):
+    ordering = 'id'
+
+
+class PrefetchedPage:
+    """
+    Stands in for the queryset given to PageNumberPagination. The count and the rows of the
+    requested page are loaded up front with the async ORM, so paginating it does not query.
+    """
+
+    def __init__(self, count, offset, rows):
+        self._count = count
+        self.offset = offset
+        self.rows = rows
+
+    @classmethod
+    async def load(cls, qs, request, paginator):
+        count = await qs.acount()
+        django_paginator = paginator.django_paginator_class(range(count), paginator.get_page_size(request))
+        number = request.query_params.get(paginator.page_query_param) or 1
+
+        if number in paginator.last_page_strings:
+            number = django_paginator.num_pages
+
+        try:
+            page = django_paginator.page(number)
+        except InvalidPage:
+            # left to PageNumberPagination, which reports it as not found
+            return cls(count, 0, [])
+
+        bottom, top = page.object_list.start, page.object_list.stop
+        return cls(count, bottom, [obj async for obj in qs[bottom:top]])
+
+    def count(self):
+        return self._count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        return self.rows[index.start - self.offset:index.stop - self.offset]
+
 
 class PaginatorMixin:
-    def paginate(self, qs, request, serializer_class):
-        paginator = PageNumberPagination()
+    def get_paginator(self, request):
+        if request.query_params.get('pagination') == 'cursor':
+            paginator = KeysetPagination()
+        else:
+            paginator = PageNumberPagination()
         paginator.page_size = settings.PAGE_SIZE
+        return paginator
+
+    def paginate(self, qs, request, serializer_class, context=None):
+        if hasattr(serializer_class, 'prepare'):
+            qs = serializer_class.prepare(qs)
+
+        if request.query_params.get('pagination') == 'stream':
+            rows = stream_rows(qs, serializer_class, context or {}, settings.STREAM_CHUNK_SIZE)
+            return StreamingHttpResponse(rows, content_type='application/json')
+
+        paginator = self.get_paginator(request)
         paginated_qs = paginator.paginate_queryset(qs, request)
-        serializer = serializer_class(paginated_qs, many=True)
-        return paginator.get_paginated_response(serializer.data)
\ No newline at end of file
+        serializer = serializer_class(paginated_qs, many=True, context=context or {})
+        return paginator.get_paginated_response(serializer.data)
+
+    async def apaginate(self, qs, request, serializer_class, context=None):
+        if hasattr(serializer_class, 'prepare'):
+            qs = serializer_class.prepare(qs)
+
+        if request.query_params.get('pagination') == 'stream':
+            rows = astream_rows(qs, serializer_class, context or {}, settings.STREAM_CHUNK_SIZE)
+            return StreamingHttpResponse(rows, content_type='application/json')
+
+        paginator = self.get_paginator(request)
+
+        if isinstance(paginator, KeysetPagination):
+            paginated_qs = await sync_to_async(paginator.paginate_queryset)(qs, request)
+        else:
+            paginated_qs = paginator.paginate_queryset(await PrefetchedPage.load(qs, request, paginator), request)
+
+        serializer = serializer_class(paginated_qs, many=True, context=context or {})
+        return paginator.get_paginated_response(serializer.data)
+
+
+class ExportQuerySerializer(serializers.Serializer):
+    output = serializers.ChoiceField(choices=('ndjson', 'csv'), default='ndjson')
+    created_after = serializers.DateTimeField(required=False, help_text='Only rows created at or after this time')
+    created_before = serializers.DateTimeField(required=False, help_text='Only rows created before this time')
+
+
+class ExportMixin:
+    """Streams every row of a queryset as NDJSON or CSV, the serializer has to be a ListOnlySerializer"""
+
+    def get_export(self, qs, request, serializer_class):
+        params = ExportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+
+        if 'created_after' in params.validated_data:
+            qs = qs.filter(created_at__gte=params.validated_data['created_after'])
+        if 'created_before' in params.validated_data:
+            qs = qs.filter(created_at__lt=params.validated_data['created_before'])
+
+        return serializer_class.prepare(qs.order_by('id')), ENCODERS[params.validated_data['output']]
+
+    def export_response(self, rows, encoder_class, name):
+        response = StreamingHttpResponse(rows, content_type=encoder_class.content_type)
+        response['Content-Disposition'] = f'attachment; filename="{name}.{encoder_class.extension}"'
+        return response
+
+    def stream_export(self, qs, request, serializer_class, name):
+        qs, encoder_class = self.get_export(qs, request, serializer_class)
+        rows = stream_rows(qs, serializer_class, {}, settings.STREAM_CHUNK_SIZE, encoder_class)
+        return self.export_response(rows, encoder_class, name)
+
+    def astream_export(self, qs, request, serializer_class, name):
+        qs, encoder_class = self.get_export(qs, request, serializer_class)
+        rows = astream_rows(qs, serializer_class, {}, settings.STREAM_CHUNK_SIZE, encoder_class)
+        return self.export_response(rows, encoder_class, name)
@@ -0,0 +1,19 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ASGI=Yes serves appstore.asgi with uvicorn workers, the hot read endpoints then run as async views
+if os.getenv('ASGI', '').lower() == 'yes':
+    wsgi_app = 'appstore.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'appstore.wsgi:application'
+
+bind = '0.0.0.0:8000'
+workers = int(os.getenv('GUNICORN_WORKERS', 4))
+
+errorlog = '/var/log/appstore/gunicorn-error.log'
+accesslog = '/var/log/appstore/gunicorn-access.log'
+access_log_format = "%(h)s %(l)s %(t)s '%(r)s' %(s)s %(b)s '%(f)s' '%(a)s'"